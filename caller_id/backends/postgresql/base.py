@@ -0,0 +1,82 @@
+import threading
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:  # Only needed when OPTIONS['pool'] is set
+    ConnectionPool = None
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with an optional in-process connection pool.
+
+    With OPTIONS['pool'] set (keyword arguments for psycopg_pool's
+    ConnectionPool, e.g. min_size and max_size), connections are checked
+    out of a pool shared by every thread of the process and returned to it
+    when Django closes them, instead of being opened and torn down per
+    request. Requires psycopg 3 and psycopg_pool.
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool_options(self):
+        return self.settings_dict['OPTIONS'].get('pool')
+
+    @property
+    def pool(self):
+        if not self.pool_options:
+            return None
+        with self._pools_lock:
+            pool = self._pools.get(self.alias)
+            if pool is None:
+                if ConnectionPool is None or not base.is_psycopg3:
+                    raise ImproperlyConfigured('The connection pool requires psycopg 3 and psycopg_pool.')
+                pool = self._pools[self.alias] = ConnectionPool(
+                    kwargs=self.get_connection_params(),
+                    check=ConnectionPool.check_connection,
+                    open=True,
+                    **self.pool_options
+                )
+            return pool
+
+    @classmethod
+    def close_pools(cls):
+        """Close every pool of this process, e.g. before it exits"""
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                pool.close()
+            cls._pools.clear()
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is None:
+            self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        else:
+            try:
+                self.isolation_level = base.IsolationLevel(isolation_level)
+            except ValueError:
+                raise ImproperlyConfigured(f'Invalid transaction isolation level {isolation_level} specified.')
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
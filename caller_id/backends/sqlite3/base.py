@@ -0,0 +1,36 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend with tunable connection settings.
+
+    OPTIONS:
+        pragmas: dict of PRAGMA name to value run on every new connection
+            (e.g. journal_mode, synchronous, mmap_size, busy_timeout)
+        transaction_mode: DEFERRED, IMMEDIATE or EXCLUSIVE, how transactions
+            begin (default DEFERRED, SQLite's own default)
+    """
+    TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @property
+    def transaction_mode(self):
+        mode = str(self.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED')).upper()
+        if mode not in self.TRANSACTION_MODES:
+            raise ValueError(f'Invalid SQLite transaction mode: {mode}')
+        return mode
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
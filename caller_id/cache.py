@@ -0,0 +1,283 @@
+import os
+import pickle
+import tempfile
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """
+    Two-tier cache: a small bounded in-process LRU (L1) in front of a cache
+    shared by every worker process (L2, another entry in settings.CACHES).
+
+    Reads are served from L1 when possible and fall back to L2, writes and
+    deletes go to both. L1 entries live at most LOCAL_TIMEOUT seconds, which
+    bounds how stale a worker can be after another worker changes a key.
+    Keys starting with one of LOCAL_EXCLUDE_PREFIXES (e.g. throttle history)
+    always go to L2 so they are shared across processes.
+
+    OPTIONS:
+        SHARED_CACHE: alias of the L2 cache (default 'shared')
+        LOCAL_MAX_ENTRIES: L1 capacity (default 1000)
+        LOCAL_TIMEOUT: L1 lifetime in seconds (default 5)
+        LOCAL_EXCLUDE_PREFIXES: key prefixes never kept in L1
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_CACHE', 'shared')
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._local_exclude = tuple(options.get('LOCAL_EXCLUDE_PREFIXES', ()))
+        self._local = OrderedDict()
+        self._lock = Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # L1 helpers
+
+    def _is_local(self, key):
+        return not key.startswith(self._local_exclude)
+
+    def _local_get(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return _MISSING
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._local[local_key]
+                return _MISSING
+            self._local.move_to_end(local_key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, local_key, value, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            lifetime = self._local_timeout
+        else:
+            lifetime = min(self._local_timeout, timeout - time.time())
+        if lifetime <= 0:
+            self._local_delete(local_key)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._local[local_key] = (pickled, time.monotonic() + lifetime)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, local_key):
+        with self._lock:
+            return self._local.pop(local_key, None) is not None
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if self._is_local(key):
+            value = self._local_get(local_key)
+            if value is not _MISSING:
+                self.stats['local_hits'] += 1
+                return value
+
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self.stats['misses'] += 1
+            return default
+
+        self.stats['shared_hits'] += 1
+        if self._is_local(key):
+            self._local_set(local_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = []
+        for key in keys:
+            value = _MISSING
+            if self._is_local(key):
+                value = self._local_get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        self.stats['local_hits'] += len(found)
+
+        if remaining:
+            shared = self.shared.get_many(remaining, version=version)
+            self.stats['shared_hits'] += len(shared)
+            self.stats['misses'] += len(remaining) - len(shared)
+            for key, value in shared.items():
+                if self._is_local(key):
+                    self._local_set(self.make_and_validate_key(key, version=version), value, DEFAULT_TIMEOUT)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(key, value, timeout=self._shared_timeout(timeout), version=version)
+        if self._is_local(key):
+            self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout=self._shared_timeout(timeout), version=version)
+        for key, value in data.items():
+            if self._is_local(key) and key not in failed:
+                self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(key, value, timeout=self._shared_timeout(timeout), version=version)
+        if added and self._is_local(key):
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout=self._shared_timeout(timeout), version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    async def aincr(self, key, delta=1, version=None):
+        # BaseCache.aincr is a get and a set; keep the shared cache's own incr
+        return await sync_to_async(self.incr, thread_sensitive=True)(key, delta, version)
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        local_deleted = self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version) or local_deleted
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def _shared_timeout(self, timeout):
+        # Resolve our own default so TIMEOUT on this alias applies to L2 too
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+class SharedFileCache(FileBasedCache):
+    """
+    File-based cache shared by every worker process on one host, used as
+    the L2 of TieredCache when there is no Redis.
+
+    Readers never wait: every write replaces an entry's file with a single
+    rename. add() and incr() check and write under an exclusive lock on one
+    of LOCK_STRIPES lock files picked from the key, so like Redis they are
+    atomic across processes, and incr() keeps the entry's expiry.
+    FileBasedCache lists the whole directory on every set to cull it; here
+    that happens at most once every CULL_INTERVAL seconds per process.
+
+    OPTIONS (besides FileBasedCache's MAX_ENTRIES and CULL_FREQUENCY):
+        LOCK_STRIPES: number of lock files (default 64)
+        CULL_INTERVAL: seconds between culls (default 60)
+    """
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._lock_stripes = int(options.get('LOCK_STRIPES', 64))
+        self._cull_interval = float(options.get('CULL_INTERVAL', 60))
+        self._next_cull = 0
+
+    @contextmanager
+    def _key_lock(self, fname):
+        # Lock files are never deleted, or a process could lock a file
+        # another has just replaced; a fixed set of them is reused instead
+        lock_dir = os.path.join(self._dir, 'locks')
+        os.makedirs(lock_dir, 0o700, exist_ok=True)
+        stripe = int(os.path.basename(fname)[:8], 16) % self._lock_stripes
+        with open(os.path.join(lock_dir, f'{stripe}.lock'), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def _read(self, fname):
+        """(expiry, value) of the entry in fname, or None if it is missing or expired"""
+        try:
+            with open(fname, 'rb') as f:
+                try:
+                    expiry = pickle.load(f)
+                except EOFError:
+                    return None
+                if expiry is not None and expiry < time.time():
+                    return None
+                return expiry, pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+
+    def _write(self, fname, expiry, value):
+        self._createdir()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        renamed = False
+        try:
+            with open(fd, 'wb') as f:
+                f.write(pickle.dumps(expiry, self.pickle_protocol))
+                f.write(zlib.compress(pickle.dumps(value, self.pickle_protocol)))
+            file_move_safe(tmp_path, fname, allow_overwrite=True)
+            renamed = True
+        finally:
+            if not renamed:
+                os.remove(tmp_path)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        fname = self._key_to_file(key, version)
+        with self._key_lock(fname):
+            if self._read(fname) is not None:
+                return False
+            self._cull()
+            self._write(fname, self.get_backend_timeout(timeout), value)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        fname = self._key_to_file(key, version)
+        with self._key_lock(fname):
+            entry = self._read(fname)
+            if entry is None:
+                raise ValueError(f"Key '{key}' not found")
+            expiry, value = entry
+            self._write(fname, expiry, value + delta)
+        return value + delta
+
+    async def aincr(self, key, delta=1, version=None):
+        return await sync_to_async(self.incr, thread_sensitive=True)(key, delta, version)
+
+    def _cull(self):
+        if time.monotonic() < self._next_cull:
+            return
+        self._next_cull = time.monotonic() + self._cull_interval
+        super()._cull()
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY_PREFIX = 'replica_sticky_'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route the ORM reads made inside the block to REPLICA_DATABASE"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def stick_to_primary(user):
+    """Keep user's reads on the primary for REPLICA_STICKY_TIMEOUT seconds after a write"""
+    cache.set(f'{STICKY_KEY_PREFIX}{user.pk}', 1, settings.REPLICA_STICKY_TIMEOUT)
+
+
+def is_stuck_to_primary(user):
+    return user.is_authenticated and cache.get(f'{STICKY_KEY_PREFIX}{user.pk}') is not None
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads made under replica_reads() to REPLICA_DATABASE and
+    everything else to the primary.
+
+    Writes always go to the primary, including saves of objects that were
+    read from the replica. Reads inside a transaction on the primary stay
+    on it, so a read-modify-write (e.g. refreshing spam statistics) never
+    works from a lagging copy.
+    """
+    def db_for_read(self, model, **hints):
+        replica = settings.REPLICA_DATABASE
+        if replica and _use_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve an API view's reads from the read replica.
+    Requests using one of replica_methods go to the replica once the user
+    is authenticated, unless the user wrote something in the last
+    REPLICA_STICKY_TIMEOUT seconds (see StickyPrimaryMiddleware), so users
+    always read their own writes.
+    """
+    replica_methods = ('GET', 'HEAD')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in self.replica_methods:
+            # Tell StickyPrimaryMiddleware this request did not write
+            request._request.replica_read = True
+            if not is_stuck_to_primary(request.user):
+                self._replica_token = _use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _use_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class StickyPrimaryMiddleware:
+    """
+    After a successful write request (any method other than GET, HEAD or
+    OPTIONS, not served by a ReplicaReadMixin view) by an authenticated
+    user, keep that user's reads on the primary until the replica has
+    caught up.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            stick_to_primary(request.user)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            await sync_to_async(stick_to_primary)(request.user)
+        return response
+
+    def wrote(self, request, response):
+        user = getattr(request, 'user', None)
+        return (
+            request.method not in SAFE_METHODS
+            and not getattr(request, 'replica_read', False)
+            and response.status_code < 400
+            and user is not None and user.is_authenticated
+        )
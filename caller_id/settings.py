@@ -14,7 +14,9 @@ import os
 from pathlib import Path
 import sys
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
+from caller_id.database import database_config
 
 # Load environment variables
 load_dotenv()
@@ -60,6 +62,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'caller_id.routers.StickyPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,11 +91,10 @@ WSGI_APPLICATION = 'caller_id.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL selects the database (postgres://... or sqlite:///...), and
+# DB_* / SQLITE_* variables tune connections; see caller_id/database.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}")),
 }
 
 
@@ -182,6 +184,7 @@ if TESTING:
         # Commented out for testing
         # 'django.middleware.csrf.CsrfViewMiddleware',
         'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'caller_id.routers.StickyPrimaryMiddleware',
         'django.contrib.messages.middleware.MessageMiddleware',
         'django.middleware.clickjacking.XFrameOptionsMiddleware',
     ]
@@ -195,13 +198,164 @@ SIMPLE_JWT = {
 PHONENUMBER_DEFAULT_REGION = 'US'
 PHONENUMBER_DEFAULT_FORMAT = 'INTERNATIONAL'
 
+# Cache timeout in seconds
+CACHE_TIMEOUT = 60 * 15  # 15 minutes
+
+# Spam statistics are dropped from the cache whenever a contact or spam
+# report changes, so they can be kept much longer than other entries
+SPAM_STATS_CACHE_TIMEOUT = 60 * 60 * 6  # 6 hours
+
+# Cache stampede protection. Expired entries are served for up to
+# CACHE_STALE_TIMEOUT more seconds while a single request (holding a
+# lock for at most CACHE_LOCK_TIMEOUT seconds) recomputes them; requests
+# with nothing to serve wait up to CACHE_LOCK_WAIT seconds for it.
+# CACHE_EARLY_EXPIRATION_BETA scales probabilistic early recomputation
+# (0 disables it). The lock is a cache.add() on the shared cache, so it
+# only holds across worker processes when add() is atomic there (Redis,
+# see the cache settings below). Each process sums its stampede counters
+# and writes them to the shared cache every CACHE_COUNTER_FLUSH_INTERVAL
+# seconds.
+CACHE_STALE_TIMEOUT = 60 * 5
+CACHE_LOCK_TIMEOUT = 10
+CACHE_LOCK_WAIT = 0.5
+CACHE_EARLY_EXPIRATION_BETA = 1.0
+CACHE_COUNTER_FLUSH_INTERVAL = 10
+
 # Cache settings
-CACHES = {
-    'default': {
+# 'default' is a small per-process LRU in front of the 'shared' cache used by
+# every worker. Throttles, stampede locks (caller_id/stampede.py) and
+# counters rely on the shared cache's add() and incr() being atomic across
+# workers. The shared tier is Redis when REDIS_URL is set, otherwise files
+# in CACHE_DIR, which every worker process on the host shares
+# (caller_id.cache.SharedFileCache locks around add() and incr()). Tests
+# keep it in memory.
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+elif TESTING:
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'LOCATION': 'shared-cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'caller_id.cache.SharedFileCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'caller_id.cache.TieredCache',
+        'TIMEOUT': CACHE_TIMEOUT,
+        'OPTIONS': {
+            'SHARED_CACHE': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            # Throttle history, stampede locks and counters and search
+            # cache generations must be shared so they hold across workers
+            'LOCAL_EXCLUDE_PREFIXES': ['throttle_', 'stampede_', 'search_generation_'],
+        },
+    },
+    'shared': dict(SHARED_CACHE, TIMEOUT=CACHE_TIMEOUT),
 }
 
-# Cache timeout in seconds
-CACHE_TIMEOUT = 60 * 15  # 15 minutes
+# Spam scoring. DecayedScorer weights reports by reporter reputation and
+# halves their weight every SPAM_SCORE_HALF_LIFE seconds; RatioScorer
+# counts every report equally and forever.
+SPAM_SCORER = 'contacts.scoring.DecayedScorer'
+SPAM_SCORE_HALF_LIFE = 60 * 60 * 24 * 90  # 90 days
+
+# Bloom filter over every reported phone number. Numbers it rules out are
+# answered as 0% spam without a cache or database lookup. A filter built
+# in memory only learns the reports made through its own process, so with
+# several worker processes (WEB_CONCURRENCY, read by gunicorn and uvicorn)
+# SPAM_FILTER_PATH is required and they all map one shared file; rebuild it
+# with `python manage.py build_spam_filter` after loading reports without
+# going through the ORM.
+SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+SPAM_FILTER_ENABLED = os.environ.get('SPAM_FILTER_ENABLED', 'False') == 'True'
+SPAM_FILTER_PATH = os.environ.get('SPAM_FILTER_PATH')
+if SPAM_FILTER_ENABLED and not SPAM_FILTER_PATH and SERVER_WORKERS > 1:
+    raise ImproperlyConfigured(
+        f'SPAM_FILTER_ENABLED with WEB_CONCURRENCY={SERVER_WORKERS} needs a shared filter file; '
+        'set SPAM_FILTER_PATH'
+    )
+SPAM_FILTER_CAPACITY = 1000000
+SPAM_FILTER_ERROR_RATE = 0.01
+
+# Largest number of phone numbers accepted by one batch spam check
+SPAM_CHECK_BATCH_MAX_SIZE = 1000
+
+# Search pagination: default page size and the largest page a client may request
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# The part of search results that is the same for every searcher is cached
+# for SEARCH_CACHE_TIMEOUT seconds (and dropped when users, profiles or
+# contacts change). Queries matching more than SEARCH_CACHE_MAX_RESULTS
+# results are cached only up to that many.
+SEARCH_CACHE_TIMEOUT = 60
+SEARCH_CACHE_MAX_RESULTS = 500
+
+# Number of contacts validated and inserted per batch during bulk import
+CONTACT_IMPORT_BATCH_SIZE = 500
+
+# Threads that run background import jobs inside each server process.
+# Set to 0 to leave jobs to `python manage.py run_import_worker`.
+IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', 2))
+
+# A running import job whose worker has not finished a chunk for this many
+# seconds is assumed dead and taken over by another worker
+IMPORT_JOB_LEASE_TIMEOUT = 300
+
+# Failed rows kept in an import job's failures; the rest are only counted
+IMPORT_JOB_MAX_FAILURES = 100
+
+# Rows fetched per database round trip when streaming contact exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Search, spam check, contact list and export reads go to the read replica
+# at DATABASE_REPLICA_URL (same forms as DATABASE_URL) when it is set. A user
+# who just wrote something reads from the primary for REPLICA_STICKY_TIMEOUT
+# seconds, long enough for the replica to catch up.
+DATABASE_ROUTERS = ['contacts.sharding.ContactShardRouter', 'caller_id.routers.PrimaryReplicaRouter']
+REPLICA_DATABASE = None
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = database_config(os.environ['DATABASE_REPLICA_URL'])
+    REPLICA_DATABASE = 'replica'
+elif TESTING:
+    # A second database for testing the router, enabled per test
+    DATABASES['replica'] = database_config('sqlite:///:memory:')
+REPLICA_STICKY_TIMEOUT = 5
+
+# Contacts can be sharded by owner over the databases in
+# DATABASE_SHARD_URLS (comma separated, same forms as DATABASE_URL); see
+# contacts/sharding.py. Lookups across every owner query the shards in
+# parallel on CONTACT_SHARD_WORKERS threads (default: one per shard).
+# Contact ids come from a sequence on the default database; each process
+# reserves CONTACT_ID_BLOCK_SIZE of them at a time for single creates.
+CONTACT_SHARDS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_SHARD_URLS', '').split(','))):
+    DATABASES[f'shard{index}'] = database_config(url.strip())
+    CONTACT_SHARDS.append(f'shard{index}')
+if TESTING and not CONTACT_SHARDS:
+    # Databases for testing sharding, enabled per test
+    DATABASES['shard0'] = database_config('sqlite:///:memory:')
+    DATABASES['shard1'] = database_config('sqlite:///:memory:')
+CONTACT_SHARD_WORKERS = None
+CONTACT_ID_BLOCK_SIZE = 100
+
+# Maximum number of changed and deleted contacts returned per delta sync call
+CONTACT_SYNC_PAGE_SIZE = 500
+
+# Delta sync watermarks stay this many seconds behind the newest row, so
+# rows committed late by transactions up to this long are still returned
+CONTACT_SYNC_SAFETY_LAG = 60 * 5
+
+# Tombstones of deleted contacts are kept this long (prune them with
+# `python manage.py prune_contact_tombstones`); older sync tokens expire
+CONTACT_TOMBSTONE_RETENTION = 60 * 60 * 24 * 30  # 30 days
@@ -0,0 +1,289 @@
+import asyncio
+import math
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .routers import replica_reads
+
+LOCK_KEY_PREFIX = 'stampede_lock_'
+COUNTER_KEY_PREFIX = 'stampede_count_'
+COUNTERS = ('recomputed', 'deduplicated')
+
+
+def lock_key(key):
+    return f'{LOCK_KEY_PREFIX}{key}'
+
+
+def wrap(value, timeout, delta=0.0):
+    """
+    Cache envelope for value: (value, soft expiry, seconds the value took
+    to compute). The entry is kept CACHE_STALE_TIMEOUT seconds past its
+    soft expiry so it can be served while it is recomputed.
+    """
+    return (value, time.time() + timeout, delta)
+
+
+def set_many_fresh(data, timeout, delta=0.0):
+    """Store freshly computed values (a dict of cache key to value) in envelopes"""
+    if data:
+        cache.set_many(
+            {key: wrap(value, timeout, delta) for key, value in data.items()},
+            timeout + settings.CACHE_STALE_TIMEOUT
+        )
+
+
+def add_many_fresh(data, timeout):
+    """Store values in envelopes for the keys that have no cached value"""
+    for key, value in data.items():
+        cache.add(key, wrap(value, timeout), timeout + settings.CACHE_STALE_TIMEOUT)
+
+
+def is_fresh(envelope, now):
+    """
+    True if an envelope does not need recomputing yet. Close to expiry a
+    value is recomputed early with a probability that grows with its
+    compute time (XFetch), so one request usually refreshes a hot key
+    before it expires for everyone.
+    """
+    _, expires_at, delta = envelope
+    beta = settings.CACHE_EARLY_EXPIRATION_BETA
+    if beta and delta:
+        return now - delta * beta * math.log(1.0 - random.random()) < expires_at
+    return now < expires_at
+
+
+async def aset_many_fresh(data, timeout, delta=0.0):
+    """Async set_many_fresh"""
+    if data:
+        await cache.aset_many(
+            {key: wrap(value, timeout, delta) for key, value in data.items()},
+            timeout + settings.CACHE_STALE_TIMEOUT
+        )
+
+
+_pending_counts = dict.fromkeys(COUNTERS, 0)
+_pending_lock = threading.Lock()
+_counts_flushed_at = time.monotonic()
+
+
+def _take_counts(name=None, amount=0, flush=False):
+    """
+    Add to this process's pending counts and return them for writing to
+    the shared counters once CACHE_COUNTER_FLUSH_INTERVAL seconds have
+    passed since the last write (or right away with flush); else None.
+    """
+    global _counts_flushed_at
+    with _pending_lock:
+        if name is not None:
+            _pending_counts[name] += amount
+        now = time.monotonic()
+        if not flush and now - _counts_flushed_at < settings.CACHE_COUNTER_FLUSH_INTERVAL:
+            return None
+        pending = {name: amount for name, amount in _pending_counts.items() if amount}
+        _pending_counts.update(dict.fromkeys(COUNTERS, 0))
+        _counts_flushed_at = now
+    return pending
+
+
+def _write_counts(pending):
+    for name, amount in pending.items():
+        key = f'{COUNTER_KEY_PREFIX}{name}'
+        if not cache.add(key, amount, None):
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                pass
+
+
+async def _awrite_counts(pending):
+    for name, amount in pending.items():
+        key = f'{COUNTER_KEY_PREFIX}{name}'
+        if not await cache.aadd(key, amount, None):
+            try:
+                await cache.aincr(key, amount)
+            except ValueError:
+                pass
+
+
+def count(name, amount=1):
+    """
+    Add to one of the stampede counters. Counts are summed in the process
+    and written to the shared counters at most every
+    CACHE_COUNTER_FLUSH_INTERVAL seconds, so a cache miss does not cost
+    extra round trips to the shared cache.
+    """
+    if amount:
+        pending = _take_counts(name, amount)
+        if pending:
+            _write_counts(pending)
+
+
+async def acount(name, amount=1):
+    """Async count"""
+    if amount:
+        pending = _take_counts(name, amount)
+        if pending:
+            await _awrite_counts(pending)
+
+
+def flush_counts():
+    """Write this process's pending counts to the shared counters now"""
+    _write_counts(_take_counts(flush=True))
+
+
+def get_stampede_stats():
+    """
+    Shared counters: values recomputed, and recomputations avoided by
+    serving or waiting for another request's result. Counts other
+    processes have not written yet are not included.
+    """
+    flush_counts()
+    values = cache.get_many([f'{COUNTER_KEY_PREFIX}{name}' for name in COUNTERS])
+    return {name: values.get(f'{COUNTER_KEY_PREFIX}{name}', 0) for name in COUNTERS}
+
+
+def _wait_for(keys):
+    """Poll the cache for values another request is computing, up to CACHE_LOCK_WAIT seconds"""
+    found = {}
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while True:
+        remaining = [key for key in keys if key not in found]
+        found.update(
+            (key, envelope) for key, envelope in cache.get_many(remaining).items()
+            if isinstance(envelope, tuple)
+        )
+        if len(found) == len(keys) or time.monotonic() >= deadline:
+            return found
+        time.sleep(0.05)
+
+
+def get_or_compute_many(keys, compute, timeout):
+    """
+    Read many values from the cache, recomputing missing and expiring ones
+    with single-flight protection.
+
+    keys maps cache keys to items; compute(items) returns a dict of item
+    to value for a list of items. Each key is recomputed by whichever
+    request first takes its lock (a cache.add lease). Other requests
+    serve the stale value meanwhile, or wait up to CACHE_LOCK_WAIT seconds
+    for the new one when there is none. The lock excludes other processes
+    because the shared cache's add() is atomic across them (Redis, or
+    SharedFileCache on one host).
+    compute always reads from the primary, even under replica_reads():
+    its values are served to every user, and a lagging replica would
+    keep them stale until they expire.
+    Returns a dict of item to value.
+    """
+    now = time.time()
+    cached = cache.get_many(list(keys))
+    results = {}
+    expiring = []
+    for key, item in keys.items():
+        envelope = cached.get(key)
+        if not isinstance(envelope, tuple):
+            expiring.append(key)
+            continue
+        results[item] = envelope[0]
+        if not is_fresh(envelope, now):
+            expiring.append(key)
+    if not expiring:
+        return results
+
+    locked = [key for key in expiring if cache.add(lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT)]
+    owned = set(locked)
+    # Stale values are served as they are while the lock holder refreshes them
+    deduplicated = sum(1 for key in expiring if key not in owned and keys[key] in results)
+
+    waiting = [key for key in expiring if key not in owned and keys[key] not in results]
+    if waiting:
+        found = _wait_for(waiting)
+        for key, envelope in found.items():
+            results[keys[key]] = envelope[0]
+        deduplicated += len(found)
+        # Give up on a lock holder that is too slow and compute ourselves
+        owned.update(key for key in waiting if key not in found)
+
+    to_compute = [key for key in expiring if key in owned]
+    if to_compute:
+        started = time.monotonic()
+        try:
+            with replica_reads(False):
+                computed = compute([keys[key] for key in to_compute])
+            set_many_fresh(
+                {key: computed[keys[key]] for key in to_compute if keys[key] in computed},
+                timeout, time.monotonic() - started
+            )
+        finally:
+            if locked:
+                cache.delete_many([lock_key(key) for key in locked])
+        results.update(computed)
+
+    count('recomputed', len(to_compute))
+    count('deduplicated', deduplicated)
+    return results
+
+
+async def _await_for(keys):
+    """Async _wait_for, sleeping without blocking the event loop"""
+    found = {}
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while True:
+        remaining = [key for key in keys if key not in found]
+        found.update(
+            (key, envelope) for key, envelope in (await cache.aget_many(remaining)).items()
+            if isinstance(envelope, tuple)
+        )
+        if len(found) == len(keys) or time.monotonic() >= deadline:
+            return found
+        await asyncio.sleep(0.05)
+
+
+async def aget_or_compute_many(keys, compute, timeout):
+    """Async get_or_compute_many; compute is a coroutine function"""
+    now = time.time()
+    cached = await cache.aget_many(list(keys))
+    results = {}
+    expiring = []
+    for key, item in keys.items():
+        envelope = cached.get(key)
+        if not isinstance(envelope, tuple):
+            expiring.append(key)
+            continue
+        results[item] = envelope[0]
+        if not is_fresh(envelope, now):
+            expiring.append(key)
+    if not expiring:
+        return results
+
+    locked = [key for key in expiring if await cache.aadd(lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT)]
+    owned = set(locked)
+    deduplicated = sum(1 for key in expiring if key not in owned and keys[key] in results)
+
+    waiting = [key for key in expiring if key not in owned and keys[key] not in results]
+    if waiting:
+        found = await _await_for(waiting)
+        for key, envelope in found.items():
+            results[keys[key]] = envelope[0]
+        deduplicated += len(found)
+        owned.update(key for key in waiting if key not in found)
+
+    to_compute = [key for key in expiring if key in owned]
+    if to_compute:
+        started = time.monotonic()
+        try:
+            with replica_reads(False):
+                computed = await compute([keys[key] for key in to_compute])
+            await aset_many_fresh(
+                {key: computed[keys[key]] for key in to_compute if keys[key] in computed},
+                timeout, time.monotonic() - started
+            )
+        finally:
+            if locked:
+                await cache.adelete_many([lock_key(key) for key in locked])
+        results.update(computed)
+
+    await acount('recomputed', len(to_compute))
+    await acount('deduplicated', deduplicated)
+    return results
@@ -0,0 +1,239 @@
+"""
+Async versions of the read-heavy search and spam check endpoints.
+
+DRF 3.14 views are synchronous, so these are plain Django async views
+that authenticate the JWT themselves and use the async ORM. Under an ASGI
+server a worker keeps serving other requests while one waits on the
+database or cache. A request's own queries still run one at a time:
+Django 4.2 runs every async ORM call through thread-sensitive
+sync_to_async, so they share one thread and one connection, and starting
+them together with asyncio.gather would not overlap them.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from phonenumber_field.phonenumber import to_python
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from caller_id.routers import is_stuck_to_primary, replica_reads
+from .models import Contact, NameIndexEntry
+from .pagination import SearchCursorPagination
+from .search import (
+    asearch_contacts_by_name, registered_digits, shared_name_matches, shared_phone_matches,
+    search_name_index, merge_name_matches, name_search_page, name_search_results,
+    user_search_result, name_matches
+)
+from .serializers import SearchResultSerializer
+from .spam import aget_spam_stats, aget_spam_likelihoods, spam_stats_etag
+from .utils import normalize_phone_number
+from .views import INVALID_PHONE_NUMBER, SearchThrottle, SearchView, spam_check_data
+
+User = get_user_model()
+
+
+async def authenticate(request):
+    """
+    Authenticate a request by its JWT access token like JWTAuthentication.
+    Returns the active user, or None if the request has no valid token.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = header and authentication.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, AuthenticationFailed, KeyError):
+        return None
+    user = await User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+def error_response(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+async def throttled(request):
+    """
+    Apply SearchThrottle (the rate the sync views get from
+    UserRateThrottle) to an authenticated request. Returns a 429 response
+    if the request is over the rate, else None.
+    """
+    throttle = SearchThrottle()
+    if await sync_to_async(throttle.allow_request)(request, None):
+        return None
+    response = error_response('Request was throttled.', 429)
+    wait = throttle.wait()
+    if wait is not None:
+        response['Retry-After'] = int(wait)
+    return response
+
+
+async def spam_check(request, phone_number):
+    """Async SpamCheckView"""
+    # require_GET does not wrap coroutine views before Django 5.0
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await authenticate(request)
+    if user is None:
+        return error_response('Authentication credentials were not provided.', 401)
+    request.user = user
+    response = await throttled(request)
+    if response is not None:
+        return response
+
+    phone_obj = to_python(phone_number)
+    if phone_obj is None or not phone_obj.is_valid():
+        return JsonResponse(INVALID_PHONE_NUMBER, status=400)
+    number = normalize_phone_number(phone_obj)
+
+    with replica_reads(not await sync_to_async(is_stuck_to_primary)(user)):
+        stats = (await aget_spam_stats([phone_obj]))[number]
+    etag = spam_stats_etag(number, stats)
+    last_modified = stats['updated_at'] and int(stats['updated_at'].timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(spam_check_data(phone_obj, stats))
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def search(request):
+    """Async SearchView, returning the same pages"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await authenticate(request)
+    if user is None:
+        return error_response('Authentication credentials were not provided.', 401)
+    request.user = user
+    response = await throttled(request)
+    if response is not None:
+        return response
+
+    # DRF's request wrapper only serves query_params and the absolute URI
+    # to the paginator here; authentication was done above
+    drf_request = Request(request)
+    search_type = drf_request.query_params.get('type')
+    query = drf_request.query_params.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Query parameter is required'}, status=400)
+
+    if not search_type:
+        digit_count = sum(1 for c in query if c.isdigit())
+        search_type = 'phone' if digit_count > len(query) * 0.5 or '+' in query else 'name'
+
+    if search_type not in ('name', 'phone'):
+        return JsonResponse({'error': 'Invalid search type'}, status=400)
+
+    paginator = SearchCursorPagination()
+    page_size = paginator.get_page_size(drf_request)
+    with replica_reads(not await sync_to_async(is_stuck_to_primary)(user)):
+        try:
+            cursor = paginator.decode_cursor(drf_request)
+            search_by = search_by_name if search_type == 'name' else search_by_phone
+            results, next_position = await search_by(user, query, page_size, cursor)
+        except NotFound as e:
+            return error_response(str(e.detail), 404)
+
+        likelihoods = await aget_spam_likelihoods(result['phone_number'] for result in results)
+        contact_numbers = await owned_phone_numbers(user, results)
+    for result in results:
+        result['spam_likelihood'] = likelihoods.get(normalize_phone_number(result['phone_number']), 0.0)
+
+    serializer = SearchResultSerializer(results, many=True, context={
+        'request': request,
+        'contact_numbers': contact_numbers
+    })
+    return JsonResponse({
+        'next': paginator.get_next_link(drf_request, next_position),
+        'results': serializer.data
+    })
+
+
+async def search_by_name(user, query, page_size, cursor=None):
+    """
+    Async SearchView._search_by_name. The searcher's own contacts query
+    hides registered numbers with a subquery, like the sync view.
+    """
+    after = None
+    if cursor is not None:
+        try:
+            after = (int(cursor['rank']), int(cursor['id']))
+        except (KeyError, TypeError, ValueError):
+            raise NotFound(SearchCursorPagination.invalid_cursor_message)
+
+    shared = await sync_to_async(shared_name_matches)(query)
+    contact_matches = await asearch_contacts_by_name(
+        user, query, page_size + 1, after=after, exclude_digits=registered_digits(query)
+    )
+    if shared['complete']:
+        user_results = {result['id']: result for rank, result in shared['users']}
+        matches = merge_name_matches(shared, contact_matches, after, page_size + 1)
+    else:
+        matches = await sync_to_async(search_name_index)(user, query, page_size + 1, after=after)
+        user_results = None
+
+    matches, next_position = name_search_page(matches, page_size)
+
+    user_ids = [object_id for kind, object_id, rank in matches if kind == NameIndexEntry.KIND_USER]
+    contact_ids = [object_id for kind, object_id, rank in matches if kind == NameIndexEntry.KIND_CONTACT]
+    users = await User.objects.select_related('profile').ain_bulk(user_ids if user_results is None else [])
+    contacts = await Contact.objects.for_owner(user).ain_bulk(contact_ids)
+    for contact in contacts.values():
+        contact.owner = user
+    if user_results is None:
+        user_results = {
+            user_obj.id: user_search_result(user_obj) for user_obj in users.values()
+            if name_matches(query, user_obj.first_name, user_obj.last_name)
+        }
+
+    return name_search_results(query, matches, user_results, contacts), next_position
+
+
+async def search_by_phone(user, query, page_size, cursor=None):
+    """
+    Async SearchView._search_by_phone. Pages come from the shared search
+    cache; the uncached fallback runs the sync queries in a thread.
+    """
+    if cursor is not None and not (
+        isinstance(cursor.get('id'), int) or isinstance(cursor.get('name'), str)
+    ):
+        raise NotFound(SearchCursorPagination.invalid_cursor_message)
+
+    view = SearchView()
+    phone_lookup = view._phone_lookup(query)
+    if phone_lookup is None:
+        return [], None
+
+    shared = await sync_to_async(shared_phone_matches)(phone_lookup)
+    page = view._cached_phone_page(user, shared, page_size, cursor)
+    if page is not None:
+        return page
+    return await sync_to_async(view._search_by_phone_in_db)(user, phone_lookup, page_size, cursor)
+
+
+async def owned_phone_numbers(user, results):
+    """Async SearchView._owned_phone_numbers"""
+    numbers = {normalize_phone_number(result['phone_number']) for result in results}
+    numbers.discard(None)
+    if not numbers:
+        return set()
+    return {
+        normalize_phone_number(number)
+        async for number in Contact.objects.for_owner(user).filter(
+            phone_number__in=numbers
+        ).values_list('phone_number', flat=True)
+    }
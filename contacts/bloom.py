@@ -0,0 +1,193 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    Membership tests can return false positives but never false negatives,
+    so "not in filter" proves an item was never added. Bits are kept in a
+    bytearray, or in a shared memory-mapped file when opened with open().
+    """
+    MAGIC = b'BLM1'
+    HEADER = struct.Struct('<4sQI')  # magic, number of bits, number of hashes
+
+    def __init__(self, num_bits, num_hashes, bits=None, offset=0, file=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self._bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self._offset = offset
+        self._file = file
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        """Size a filter for capacity items at the given false positive rate"""
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item):
+        with self._lock, _FileLock(self._file):
+            for position in self._positions(item):
+                self._bits[self._offset + (position >> 3)] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self._bits[self._offset + (position >> 3)] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def save(self, path):
+        """Write the filter to path, atomically replacing any existing file"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.num_bits, self.num_hashes))
+            f.write(bytes(self._bits[self._offset:]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Map a filter saved with save(). Bits set through add() are written
+        to the file and seen by every process that maps it.
+        """
+        f = open(path, 'r+b')
+        try:
+            bits = mmap.mmap(f.fileno(), 0)
+            magic, num_bits, num_hashes = cls.HEADER.unpack_from(bits)
+        except (ValueError, struct.error):
+            f.close()
+            raise ValueError(f'{path} is not a Bloom filter file')
+        if magic != cls.MAGIC:
+            f.close()
+            raise ValueError(f'{path} is not a Bloom filter file')
+        return cls(num_bits, num_hashes, bits=bits, offset=cls.HEADER.size, file=f)
+
+    def close(self):
+        if self._file is not None:
+            self._bits.close()
+            self._file.close()
+            self._file = None
+
+
+class _FileLock:
+    """Exclusive lock on a mapped filter file, so concurrent adds from other processes are not lost"""
+    def __init__(self, file):
+        self.file = file if fcntl is not None else None
+
+    def __enter__(self):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+
+def build_reported_numbers_filter(capacity=None, error_rate=None):
+    """Build a filter containing every phone number that has a spam report"""
+    from .models import SpamReport
+    from .utils import normalize_phone_number
+
+    numbers = SpamReport.objects.order_by().values_list('phone_number', flat=True).distinct()
+    # Leave room for new reports before the filter has to be rebuilt
+    capacity = max(capacity or settings.SPAM_FILTER_CAPACITY, numbers.count() * 2)
+    bloom = BloomFilter.for_capacity(capacity, error_rate or settings.SPAM_FILTER_ERROR_RATE)
+    for number in numbers.iterator():
+        bloom.add(normalize_phone_number(number))
+    return bloom
+
+
+def write_reported_numbers_filter(path, capacity=None, error_rate=None):
+    """
+    Build the reported-numbers filter and save it to path for workers to map.
+    Returns the filter size in bytes.
+    """
+    from .models import SpamReport
+    from .utils import normalize_phone_number
+
+    started_at = timezone.now()
+    bloom = build_reported_numbers_filter(capacity, error_rate)
+    bloom.save(path)
+
+    # Reports made while building were added to the previous file only
+    mapped = BloomFilter.open(path)
+    try:
+        recent = SpamReport.objects.filter(reported_at__gte=started_at).values_list('phone_number', flat=True)
+        for number in recent:
+            mapped.add(normalize_phone_number(number))
+    finally:
+        mapped.close()
+    return bloom.HEADER.size + (bloom.num_bits + 7) // 8
+
+
+_spam_filter = None
+_spam_filter_inode = None
+_spam_filter_lock = threading.Lock()
+
+
+def get_spam_filter():
+    """
+    The filter of reported phone numbers used by this process, or None
+    when SPAM_FILTER_ENABLED is off.
+    With SPAM_FILTER_PATH set the filter file is mapped (and remapped after
+    a rebuild replaces it), otherwise it is built from the database on
+    first use.
+    """
+    global _spam_filter, _spam_filter_inode
+    if not settings.SPAM_FILTER_ENABLED:
+        return None
+
+    path = settings.SPAM_FILTER_PATH
+    with _spam_filter_lock:
+        if path:
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                write_reported_numbers_filter(path)
+                inode = os.stat(path).st_ino
+            if _spam_filter is None or inode != _spam_filter_inode:
+                # The old mapping is released once no thread is using it
+                _spam_filter = BloomFilter.open(path)
+                _spam_filter_inode = inode
+        elif _spam_filter is None:
+            _spam_filter = build_reported_numbers_filter()
+        return _spam_filter
+
+
+def add_reported_number(number):
+    """
+    Record a newly reported number. Goes to the shared filter file when
+    SPAM_FILTER_PATH is set, otherwise to this process's filter if one has
+    been built (a filter built later reads the report from the database).
+    """
+    if settings.SPAM_FILTER_ENABLED and (settings.SPAM_FILTER_PATH or _spam_filter is not None):
+        get_spam_filter().add(number)
+
+
+def reset_spam_filter():
+    """Drop the loaded filter so the next lookup reloads it"""
+    global _spam_filter, _spam_filter_inode
+    with _spam_filter_lock:
+        _spam_filter = None
+        _spam_filter_inode = None
@@ -0,0 +1,115 @@
+import csv
+import json
+import textwrap
+import zlib
+from django.conf import settings
+
+CSV_HEADER = ['Name', 'Phone Number', 'Created At']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class Echo:
+    """File-like object whose write() hands back the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size=None):
+    """
+    Yield (name, phone_number, created_at) string tuples for a contact queryset.
+    Reads plain column values through a server-side iterator, so memory use
+    does not grow with the number of contacts.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    rows = queryset.values_list('name', 'phone_number', 'created_at').iterator(chunk_size=chunk_size)
+    for name, phone_number, created_at in rows:
+        yield name, str(phone_number), created_at.strftime(DATE_FORMAT)
+
+
+def stream_csv(rows):
+    """Yield a CSV document line by line"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json(rows):
+    """
+    Yield a JSON array one element at a time.
+    The output is identical to json.dumps(list_of_contacts, indent=2).
+    """
+    first = True
+    for name, phone_number, created_at in rows:
+        item = json.dumps({
+            'name': name,
+            'phone_number': phone_number,
+            'created_at': created_at
+        }, indent=2)
+        yield ('[\n' if first else ',\n') + textwrap.indent(item, '  ')
+        first = False
+    yield '[]' if first else '\n]'
+
+
+def stream_ndjson(rows):
+    """Yield one compact JSON object per line (newline-delimited JSON)"""
+    for name, phone_number, created_at in rows:
+        yield json.dumps({
+            'name': name,
+            'phone_number': phone_number,
+            'created_at': created_at
+        }, separators=(',', ':')) + '\n'
+
+
+def buffered(parts, size=64 * 1024):
+    """Join small string parts into chunks of roughly size characters"""
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def accepted_encodings(header):
+    """Map each content coding in an Accept-Encoding header to its q-value"""
+    encodings = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[coding.lower()] = quality
+    return encodings
+
+
+def wants_gzip(request):
+    """True if the client asked for a gzip-compressed export"""
+    if request.query_params.get('compress', '').lower() == 'gzip':
+        return True
+    encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    # An explicit entry (e.g. "gzip;q=0") overrides the "*" wildcard
+    quality = encodings.get('gzip', encodings.get('x-gzip', encodings.get('*', 0.0)))
+    return quality > 0
+
+
+def gzip_stream(chunks):
+    """Compress a stream of string chunks into a gzip stream on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,138 @@
+import csv
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .models import Contact, NameIndexEntry, PhoneNumberStats, SEARCH_PHONE, invalidate_search_cache
+from .serializers import ContactSerializer
+from .sharding import assign_contact_ids, contact_db_for_owner
+from .utils import normalize_phone_number, set_phone_digits
+
+DUPLICATE_CONTACT_ERROR = 'Contact with this phone number already exists.'
+
+
+def import_failure(contact_data, error):
+    """Describe a contact that could not be imported"""
+    if not isinstance(contact_data, dict):
+        contact_data = {}
+    return {
+        'name': contact_data.get('name', ''),
+        'phone_number': contact_data.get('phone_number', ''),
+        'error': str(error)
+    }
+
+
+def import_contacts(owner, contacts_data, batch_size=None):
+    """
+    Import many contacts for owner in bulk.
+    All rows are validated and their numbers normalized up front, existing
+    duplicates are found with one IN query per batch and the remaining rows
+    are inserted with bulk_create inside a single transaction. Stats, name
+    index rows and search caches that save() signals would normally
+    maintain are refreshed in bulk afterwards.
+    Returns a tuple of (number of contacts actually inserted, list of failures).
+    """
+    batch_size = batch_size or settings.CONTACT_IMPORT_BATCH_SIZE
+    failures = []
+    pending = {}
+
+    for position, contact_data in enumerate(contacts_data):
+        serializer = ContactSerializer(data=contact_data)
+        if not serializer.is_valid():
+            failures.append((position, import_failure(contact_data, ValidationError(serializer.errors))))
+            continue
+
+        number = normalize_phone_number(serializer.validated_data['phone_number'])
+        if number in pending:
+            failures.append((position, import_failure(
+                contact_data, ValidationError({'phone_number': [DUPLICATE_CONTACT_ERROR]})
+            )))
+            continue
+
+        contact = Contact(owner=owner, **serializer.validated_data)
+        set_phone_digits(contact)
+        pending[number] = (position, contact_data, contact)
+
+    numbers = list(pending)
+    for start in range(0, len(numbers), batch_size):
+        existing = Contact.objects.for_owner(owner).filter(
+            phone_number__in=numbers[start:start + batch_size]
+        ).values_list('phone_number', flat=True)
+        for number in existing:
+            position, contact_data, contact = pending.pop(normalize_phone_number(number))
+            failures.append((position, import_failure(
+                contact_data, ValidationError({'phone_number': [DUPLICATE_CONTACT_ERROR]})
+            )))
+
+    numbers = list(pending)
+    imported = 0
+    # Contacts go to the owner's shard, the name index to the default database
+    contact_db = contact_db_for_owner(owner.pk)
+    with transaction.atomic(), transaction.atomic(using=contact_db):
+        for start in range(0, len(numbers), batch_size):
+            chunk = numbers[start:start + batch_size]
+            new_contacts = [pending[number][2] for number in chunk]
+            assign_contact_ids(new_contacts)
+            # Conflicts can only come from a concurrent import of the same numbers
+            Contact.objects.using(contact_db).bulk_create(new_contacts, ignore_conflicts=True)
+
+            # Primary keys are not returned when ignoring conflicts, so read
+            # the rows back. A row with another creation time was inserted by
+            # the concurrent import and is reported as a duplicate
+            created = []
+            for contact in Contact.objects.for_owner(owner).filter(phone_number__in=chunk):
+                position, contact_data, new_contact = pending[normalize_phone_number(contact.phone_number)]
+                if contact.created_at == new_contact.created_at:
+                    created.append(contact)
+                else:
+                    failures.append((position, import_failure(
+                        contact_data, ValidationError({'phone_number': [DUPLICATE_CONTACT_ERROR]})
+                    )))
+            imported += len(created)
+            NameIndexEntry.objects.filter(
+                kind=NameIndexEntry.KIND_CONTACT, object_id__in=[contact.pk for contact in created]
+            ).delete()
+            NameIndexEntry.objects.bulk_create(
+                [entry for contact in created for entry in NameIndexEntry.entries_for_contact(contact)],
+                batch_size=batch_size
+            )
+
+        PhoneNumberStats.refresh(numbers, batch_size=batch_size)
+        if numbers:
+            # One new generation for the whole batch instead of one per
+            # prefix and suffix of every imported number
+            invalidate_search_cache(SEARCH_PHONE)
+
+    failures.sort(key=lambda failure: failure[0])
+    return imported, [failure for position, failure in failures]
+
+
+CSV_COLUMNS = {
+    'name': 'name',
+    'phone_number': 'phone_number',
+    'phone number': 'phone_number',
+}
+
+
+def parse_contacts_csv(csv_file):
+    """
+    Read contacts from an uploaded CSV file.
+    Accepts the headers written by the CSV export ("Name", "Phone Number")
+    as well as the field names; other columns are ignored.
+    Raises ValueError if the file is not UTF-8 encoded CSV.
+    """
+    lines = (line.decode('utf-8-sig') if isinstance(line, bytes) else line for line in csv_file)
+    reader = csv.DictReader(lines)
+    contacts_data = []
+    try:
+        for row in reader:
+            contact_data = {}
+            for column, value in row.items():
+                field = CSV_COLUMNS.get((column or '').strip().lower())
+                if field:
+                    contact_data[field] = (value or '').strip()
+            contacts_data.append(contact_data)
+    except UnicodeDecodeError:
+        raise ValueError('The file must be UTF-8 encoded')
+    except csv.Error as e:
+        raise ValueError(f'Invalid CSV file: {e}')
+    return contacts_data
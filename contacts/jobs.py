@@ -0,0 +1,153 @@
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .importer import import_contacts
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    In-process worker pool for import jobs, created on first use.
+    Returns None when IMPORT_JOB_WORKERS is 0, in which case jobs are left
+    for the run_import_worker management command.
+    """
+    global _executor
+    if not settings.IMPORT_JOB_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMPORT_JOB_WORKERS,
+                thread_name_prefix='contact-import'
+            )
+    return _executor
+
+
+def enqueue_import_job(job):
+    """Hand a new job to the in-process pool once its row is committed"""
+    executor = get_executor()
+    if executor is None:
+        return
+    transaction.on_commit(lambda: executor.submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        process_import_job(job_id)
+        # Also take over jobs whose worker died, so they do not wait for
+        # run_import_worker
+        run_pending_import_jobs()
+    except Exception:
+        logger.exception('Import job %s crashed', job_id)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job after this one's lease expired"""
+
+
+def claimable_jobs():
+    """Pending jobs, and running jobs whose worker stopped renewing its lease"""
+    expired = timezone.now() - timedelta(seconds=settings.IMPORT_JOB_LEASE_TIMEOUT)
+    return ImportJob.objects.filter(
+        Q(status=ImportJob.STATUS_PENDING) | Q(status=ImportJob.STATUS_RUNNING, updated_at__lt=expired)
+    )
+
+
+def claim_import_job(job_id):
+    """
+    Atomically move a pending job, or a running job with an expired lease,
+    to running under a new lease.
+    Returns the lease token, or None if another worker holds the job.
+    """
+    token = uuid.uuid4()
+    claimed = claimable_jobs().filter(pk=job_id).update(
+        status=ImportJob.STATUS_RUNNING, lease_token=token, updated_at=timezone.now()
+    )
+    return token if claimed else None
+
+
+def save_job(job, token, fields):
+    """Save fields of job and renew its lease, if the lease is still ours"""
+    values = {field: getattr(job, field) for field in fields}
+    if not ImportJob.objects.filter(pk=job.pk, lease_token=token).update(updated_at=timezone.now(), **values):
+        raise LeaseLost()
+
+
+def process_import_job(job_id):
+    """
+    Claim a job and import its payload chunk by chunk from job.processed,
+    saving the progress counters after every chunk. Only the first
+    IMPORT_JOB_MAX_FAILURES failed rows are kept in job.failures. Each chunk and its
+    progress are committed together, so a job taken over from a dead
+    worker resumes after the last chunk that worker finished.
+    Returns True if this call processed the job.
+    """
+    token = claim_import_job(job_id)
+    if token is None:
+        return False
+
+    job = ImportJob.objects.select_related('owner').get(pk=job_id)
+    batch_size = settings.CONTACT_IMPORT_BATCH_SIZE
+    try:
+        for start in range(job.processed, len(job.payload), batch_size):
+            chunk = job.payload[start:start + batch_size]
+            with transaction.atomic():
+                imported, failures = import_contacts(job.owner, chunk, batch_size=batch_size)
+
+                job.processed = start + len(chunk)
+                job.imported += imported
+                job.failed += len(failures)
+                fields = ['processed', 'imported', 'failed']
+                # Only a sample of the failures is kept, so the list is not
+                # rewritten in full with every chunk of a file full of bad rows
+                sample = failures[:settings.IMPORT_JOB_MAX_FAILURES - len(job.failures)]
+                if sample:
+                    job.failures.extend(sample)
+                    fields.append('failures')
+                save_job(job, token, fields)
+
+        job.status = ImportJob.STATUS_COMPLETED
+        # The payload is no longer needed once every row has been handled
+        job.payload = []
+        save_job(job, token, ['status', 'payload'])
+    except LeaseLost:
+        logger.warning('Import job %s was taken over by another worker', job_id)
+    except Exception as e:
+        logger.exception('Import job %s failed', job_id)
+        job.status = ImportJob.STATUS_FAILED
+        job.error = str(e)
+        try:
+            save_job(job, token, ['status', 'error'])
+        except LeaseLost:
+            pass
+    return True
+
+
+def run_pending_import_jobs(limit=None):
+    """
+    Process pending jobs, and running jobs whose worker died, oldest first.
+    Returns the number of jobs processed by this call.
+    """
+    pending = claimable_jobs().values_list('pk', flat=True)
+    if limit:
+        pending = pending[:limit]
+
+    processed = 0
+    for job_id in list(pending):
+        if process_import_job(job_id):
+            processed += 1
+    return processed
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from contacts.bloom import write_reported_numbers_filter
+
+class Command(BaseCommand):
+    help = 'Builds the Bloom filter of reported phone numbers shared by worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.SPAM_FILTER_PATH, help='File to write (defaults to SPAM_FILTER_PATH)')
+        parser.add_argument('--capacity', type=int, default=settings.SPAM_FILTER_CAPACITY, help='Expected number of reported numbers')
+        parser.add_argument('--error-rate', type=float, default=settings.SPAM_FILTER_ERROR_RATE, help='Target false positive rate')
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError('Set SPAM_FILTER_PATH or pass --path')
+
+        self.stdout.write('Building reported numbers filter...')
+        size = write_reported_numbers_filter(
+            options['path'], capacity=options['capacity'], error_rate=options['error_rate']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {size} bytes to {options['path']}"))
@@ -0,0 +1,251 @@
+import re
+from contextlib import ExitStack
+from importlib import import_module
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+from contacts.models import Contact, SpamReport
+from contacts.sharding import contact_databases
+from contacts.utils import normalize_phone_number
+
+# The indexes shown as "before" are the ones these migrations add
+INDEX_MIGRATIONS = [
+    'contacts.migrations.0011_query_pattern_indexes',
+    'contacts.migrations.0014_name_index_search_indexes',
+]
+
+# SQLite reports "SCAN <table>" for a pass over a whole table or index,
+# PostgreSQL "Seq Scan on <table>"
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\w+)|Seq Scan on (\w+)')
+
+# An index search and the columns it is constrained on: SQLite reports
+# "SEARCH <table> USING INDEX <index> (<col>=? AND ...)", PostgreSQL an
+# "Index Scan using <index> on <table>" line followed by "Index Cond: (...)"
+SQLITE_SEARCH = re.compile(r'^SEARCH (\w+) USING (?:COVERING )?INDEX \w+ \((.*)\)$')
+POSTGRESQL_INDEX_SCAN = re.compile(r'Index (?:Only )?Scan (?:Backward )?using \w+ on (\w+)')
+POSTGRESQL_INDEX_COND = re.compile(r'^Index Cond: (.*)$')
+CONDITION_COLUMN = re.compile(r'^\(*(\w+)\)*(?:::\w+)?\s*(=|<|>|<=|>=)')
+
+# Rows sorted after they were read: SQLite's temporary B-trees,
+# PostgreSQL's Sort nodes
+SORT = re.compile(r'^USE TEMP B-TREE FOR |^(?:->\s+)?(?:Incremental )?Sort\b')
+
+
+def explain(connection, sql, comment=''):
+    """
+    Query plan lines for sql on connection. SQLite plans an EXPLAIN when
+    it is prepared and the driver reuses prepared statements with the same
+    text, so plans taken after a schema change need a different comment.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN /* {comment} */ {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [row[0].strip() for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Tables a query plan reads in full"""
+    return [next(filter(None, match.groups())) for match in map(FULL_SCAN.search, plan) if match]
+
+
+def _low_cardinality(table, column):
+    """Whether column of table only holds a few values: a field with choices, or a boolean"""
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            for field in model._meta.concrete_fields:
+                if field.column == column:
+                    return bool(field.choices) or field.get_internal_type() == 'BooleanField'
+    return False
+
+
+def weak_searches(plan):
+    """
+    Tables a query plan searches through an index constrained only by
+    equality on low-cardinality columns (e.g. kind=?). Such a search reads
+    every row with that value, for every user, so it grows with the whole
+    table like a full scan.
+    """
+    searches = []
+    table = None
+    for line in plan:
+        match = SQLITE_SEARCH.search(line)
+        if match:
+            table, conditions = match.group(1), match.group(2).split(' AND ')
+        else:
+            scan = POSTGRESQL_INDEX_SCAN.search(line)
+            if scan:
+                table = scan.group(1)
+                continue
+            match = POSTGRESQL_INDEX_COND.search(line)
+            if not match or table is None:
+                continue
+            conditions = match.group(1).strip('()').split(') AND (')
+        columns = [CONDITION_COLUMN.search(condition.strip()) for condition in conditions]
+        if all(
+            column and column.group(2) == '=' and _low_cardinality(table, column.group(1))
+            for column in columns
+        ):
+            searches.append(table)
+    return searches
+
+
+def sorts(plan):
+    """Sorts a query plan runs on rows it has already read"""
+    return [line for line in plan if SORT.search(line)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Captures the SQL each API endpoint runs for a sample user and prints its query plan "
+        "with and without the query pattern indexes, flagging full table scans, index searches "
+        "on a low-cardinality column alone and sorts. Runs in a transaction that is rolled "
+        "back, so nothing is written. Until then the dropped indexes lock the tables "
+        "(PostgreSQL) or the whole database (SQLite) against writes, so run it against a copy"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='User to make the requests as (default: the first user with contacts)')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail if any query still scans a whole table, or searches an index on a '
+                 'low-cardinality column alone, with the indexes in place'
+        )
+
+    def handle(self, *args, **options):
+        contacts = Contact.objects.order_by()
+        if options['username']:
+            contacts = contacts.filter(owner__username=options['username'])
+        contact = next(filter(None, (contacts.using(alias).first() for alias in contact_databases())), None)
+        number = SpamReport.objects.order_by().values_list('phone_number', flat=True).first()
+        if contact is None or number is None:
+            raise CommandError('Needs a user with contacts and a spam report; run populate_sample_data first')
+        user = User.objects.get(pk=contact.owner_id)
+        number = normalize_phone_number(number)
+
+        # Reads inside a transaction stay on the primary and the shards,
+        # so no replica is involved
+        self.aliases = [DEFAULT_DB_ALIAS] + list(settings.CONTACT_SHARDS)
+        checks = {'full table scans': full_scans, 'low-selectivity index searches': weak_searches, 'sorts': sorts}
+        found = {(name, when): [] for name in checks for when in ('before', 'after')}
+        with ExitStack() as stack:
+            # Requests run in one transaction per database that is rolled
+            # back, so their writes and the dropped indexes never persist.
+            # The transactions also keep shard queries in this thread
+            for alias in self.aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            # No caches, so every endpoint reaches the database and no
+            # throttle applies
+            stack.enter_context(override_settings(CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+                for alias in settings.CACHES
+            }))
+
+            captured = [
+                (label, method, path, self.capture(user, method, path, data))
+                for label, method, path, data in self.endpoints(contact, number)
+            ]
+            after = [[explain(connections[alias], sql) for alias, sql in queries] for *_, queries in captured]
+            self.drop_indexes()
+            before = [
+                [explain(connections[alias], sql, 'before') for alias, sql in queries] for *_, queries in captured
+            ]
+
+            for (label, method, path, queries), before_plans, after_plans in zip(captured, before, after):
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({method.upper()} {path})'))
+                for (alias, sql), before_plan, after_plan in zip(queries, before_plans, after_plans):
+                    self.stdout.write(f'  [{alias}] {sql[:200]}')
+                    self.stdout.write(f'    before: {"; ".join(before_plan)}')
+                    self.stdout.write(f'    after:  {"; ".join(after_plan)}')
+                    for name, check in checks.items():
+                        found[name, 'before'] += [(label, item) for item in check(before_plan)]
+                        found[name, 'after'] += [(label, item) for item in check(after_plan)]
+
+            for alias in self.aliases:
+                transaction.set_rollback(True, using=alias)
+
+        for name in checks:
+            self.stdout.write(
+                f"{name.capitalize()} without the indexes: {len(found[name, 'before'])}, "
+                f"with them: {len(found[name, 'after'])}"
+            )
+        # Sorting what a selective search matched is cheap, so sorts are
+        # listed but do not fail --check
+        problems = [
+            f'{item} ({label})' for name in checks if name != 'sorts' for label, item in found[name, 'after']
+        ]
+        if found['sorts', 'after']:
+            self.stdout.write(self.style.WARNING(
+                'Sorts: ' + ', '.join(f'{item} ({label})' for label, item in found['sorts', 'after'])
+            ))
+        if problems:
+            message = 'Full table scans or low-selectivity index searches: ' + ', '.join(problems)
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('No full table scans or low-selectivity index searches'))
+
+    def endpoints(self, contact, number):
+        """(label, method, path, data) of each endpoint to run"""
+        name = contact.name.split()[0]
+        return [
+            ('contact list', 'get', '/api/contacts/', {}),
+            ('contact list search', 'get', '/api/contacts/', {'q': name}),
+            ('contact detail', 'get', f'/api/contacts/{contact.pk}/', {}),
+            ('contact changes', 'get', '/api/contacts/changes/', {}),
+            ('contact export', 'get', '/api/contacts/export/ndjson', {}),
+            ('spam check', 'get', f'/api/spam/check/{number}/', {}),
+            ('spam check batch', 'post', '/api/spam/check/batch/', {'phone_numbers': [number]}),
+            ('spam report', 'post', '/api/spam/report/', {'phone_number': number}),
+            ('search by name', 'get', '/api/search/', {'q': name, 'type': 'name'}),
+            ('search by number', 'get', '/api/search/', {'q': number, 'type': 'phone'}),
+            ('search by digits', 'get', '/api/search/', {'q': number[-7:], 'type': 'phone'}),
+            ('profile', 'get', '/api/auth/profile/', {}),
+        ]
+
+    def capture(self, user, method, path, data):
+        """(alias, sql) of every SELECT an authenticated request runs"""
+        factory = APIRequestFactory()
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        if method == 'get':
+            request = factory.get(path, data, SERVER_NAME=host)
+        else:
+            request = factory.post(path, data, format='json', SERVER_NAME=host)
+        force_authenticate(request, user=user)
+        match = resolve(path)
+
+        with ExitStack() as stack:
+            contexts = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.aliases}
+            response = match.func(request, *match.args, **match.kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            else:
+                response.render()
+        if response.status_code >= 400:
+            self.stdout.write(self.style.WARNING(f'{method.upper()} {path} returned {response.status_code}'))
+        return [
+            (alias, query['sql'])
+            for alias, context in contexts.items()
+            for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith(('SELECT', 'WITH'))
+        ]
+
+    def drop_indexes(self):
+        """Drop the indexes INDEX_MIGRATIONS add, on every database that has them"""
+        operations = [
+            operation for name in INDEX_MIGRATIONS for operation in import_module(name).Migration.operations
+        ]
+        for operation in operations:
+            model = apps.get_model('contacts', operation.model_name)
+            for alias in self.aliases:
+                if router.allow_migrate_model(alias, model):
+                    connection = connections[alias]
+                    with connection.cursor() as cursor:
+                        cursor.execute(str(operation.index.remove_sql(model, connection.schema_editor())))
@@ -49,7 +49,9 @@ class Command(BaseCommand):
                 while UserProfile.objects.filter(phone_number=phone_number).exists():
                     phone_number = f'+1{random.randint(2000000000, 9999999999)}'
                 
-                UserProfile.objects.filter(user=user).update(phone_number=phone_number)
+                # Save through the model so the indexed phone columns are filled
+                user.profile.phone_number = phone_number
+                user.profile.save()
                 created_users.append(user)
                 
                 self.stdout.write(f'  Created user: {username} ({first_name} {last_name}) with phone: {phone_number}')
@@ -58,6 +60,7 @@ class Command(BaseCommand):
                 self.stderr.write(f'Error creating user {username}: {str(e)}')
         
         # Create contacts
+        created_contacts = []
         if created_users:
             self.stdout.write(f'Creating {num_contacts} contacts...')
             
@@ -67,11 +70,11 @@ class Command(BaseCommand):
                 phone_number = f'+1{random.randint(2000000000, 9999999999)}'
                 
                 try:
-                    Contact.objects.create(
+                    created_contacts.append(Contact.objects.create(
                         owner=owner,
                         name=name,
                         phone_number=phone_number
-                    )
+                    ))
                     self.stdout.write(f'  Created contact: {name} with phone: {phone_number} (owner: {owner.username})')
                 
                 except Exception as e:
@@ -85,8 +88,8 @@ class Command(BaseCommand):
                 reporter = random.choice(created_users)
                 
                 # Sometimes report an existing contact's number
-                if random.random() < 0.3 and Contact.objects.exists():
-                    random_contact = Contact.objects.order_by('?').first()
+                if random.random() < 0.3 and created_contacts:
+                    random_contact = random.choice(created_contacts)
                     phone_number = random_contact.phone_number
                     name = random_contact.name
                 else:
@@ -107,6 +110,6 @@ class Command(BaseCommand):
 Sample data generation complete!
 Created:
 - {len(created_users)} users
-- {Contact.objects.count()} contacts
+- {len(created_contacts)} contacts
 - {SpamReport.objects.count()} spam reports
         ''')) 
\ No newline at end of file
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from contacts.sync import prune_tombstones
+
+class Command(BaseCommand):
+    help = 'Deletes tombstones of deleted contacts older than CONTACT_TOMBSTONE_RETENTION seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of tombstones deleted per query')
+
+    def handle(self, *args, **options):
+        total = prune_tombstones(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} tombstones'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from contacts.models import NameIndexEntry
+
+class Command(BaseCommand):
+    help = 'Rebuilds the name search index from registered users and contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows per insert')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding name search index...')
+
+        with transaction.atomic():
+            total = NameIndexEntry.rebuild(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} name index entries'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from contacts.models import PhoneNumberStats
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-number spam statistics table from contacts and spam reports in one streaming pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows per upsert')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Write the recomputed statistics to the cache instead of dropping cached entries'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding phone number stats...')
+
+        # Each batch is committed on its own
+        total = PhoneNumberStats.rebuild(
+            batch_size=options['batch_size'], warm_cache=options['warm_cache']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {total} phone numbers'))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from contacts.jobs import run_pending_import_jobs
+
+class Command(BaseCommand):
+    help = 'Processes pending background contact import jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to wait between polls')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Waiting for import jobs...' if not options['once'] else 'Processing import jobs...')
+
+        while True:
+            processed = run_pending_import_jobs()
+            if processed:
+                self.stdout.write(f'Processed {processed} import jobs')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('Import worker finished'))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:25
+
+from django.db import migrations, models
+from django.db.models import Count
+import phonenumber_field.modelfields
+
+
+def populate_phone_number_stats(apps, schema_editor):
+    Contact = apps.get_model('contacts', 'Contact')
+    SpamReport = apps.get_model('contacts', 'SpamReport')
+    PhoneNumberStats = apps.get_model('contacts', 'PhoneNumberStats')
+
+    def count_by_phone_number(model):
+        rows = model.objects.order_by().values('phone_number').annotate(total=Count('id'))
+        return {str(row['phone_number']): row['total'] for row in rows}
+
+    spam_counts = count_by_phone_number(SpamReport)
+    contact_counts = count_by_phone_number(Contact)
+
+    rows = []
+    for number in set(spam_counts) | set(contact_counts):
+        spam_count = spam_counts.get(number, 0)
+        contact_count = contact_counts.get(number, 0)
+        rows.append(PhoneNumberStats(
+            phone_number=number,
+            spam_count=spam_count,
+            contact_count=contact_count,
+            likelihood=round(spam_count / (spam_count + contact_count) * 100, 2),
+        ))
+    PhoneNumberStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0002_alter_contact_phone_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhoneNumberStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None, unique=True)),
+                ('spam_count', models.PositiveIntegerField(default=0)),
+                ('contact_count', models.PositiveIntegerField(default=0)),
+                ('likelihood', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'phone number stats',
+            },
+        ),
+        migrations.RunPython(populate_phone_number_stats, migrations.RunPython.noop),
+    ]
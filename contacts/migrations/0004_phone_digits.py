@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:28
+
+from django.db import migrations, models
+
+APP_LABEL = 'contacts'
+MODEL_NAMES = ('Contact', 'SpamReport')
+
+
+def populate_phone_digits(apps, schema_editor):
+    for model_name in MODEL_NAMES:
+        model = apps.get_model(APP_LABEL, model_name)
+        batch = []
+        for obj in model.objects.only('id', 'phone_number').iterator(chunk_size=1000):
+            digits = ''.join(c for c in str(getattr(obj.phone_number, 'as_e164', obj.phone_number) or '') if c.isdigit())
+            obj.phone_digits = digits
+            obj.phone_digits_reversed = digits[::-1]
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['phone_digits', 'phone_digits_reversed'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['phone_digits', 'phone_digits_reversed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0003_phonenumberstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='phone_digits',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='phone_digits_reversed',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='spamreport',
+            name='phone_digits',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='spamreport',
+            name='phone_digits_reversed',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(populate_phone_digits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+NAME_TERM_MAX_LENGTH = 32
+BATCH_SIZE = 1000
+
+
+def name_terms(value):
+    # Frozen copy of contacts.utils.name_terms as of this migration
+    value = (value or '').strip().lower()
+    return [
+        value[i:i + NAME_TERM_MAX_LENGTH]
+        for i in range(len(value))
+        if not value[i].isspace()
+    ]
+
+
+def populate_name_index(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Contact = apps.get_model('contacts', 'Contact')
+    NameIndexEntry = apps.get_model('contacts', 'NameIndexEntry')
+
+    def user_entries(user):
+        return [
+            NameIndexEntry(term=term, rank=0 if position == 0 else 2, kind='user', object_id=user.id)
+            for name in (user.first_name, user.last_name)
+            for position, term in enumerate(name_terms(name))
+        ]
+
+    def contact_entries(contact):
+        return [
+            NameIndexEntry(
+                term=term, rank=1 if position == 0 else 3, kind='contact', object_id=contact.id,
+                owner_id=contact.owner_id, phone_digits=contact.phone_digits
+            )
+            for position, term in enumerate(name_terms(contact.name))
+        ]
+
+    # Written in batches so memory stays flat however large the tables are
+    for queryset, entries_for in [
+        (User.objects.only('id', 'first_name', 'last_name'), user_entries),
+        (Contact.objects.only('id', 'name', 'owner_id', 'phone_digits'), contact_entries),
+    ]:
+        batch = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            batch.extend(entries_for(obj))
+            if len(batch) >= BATCH_SIZE:
+                NameIndexEntry.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                batch = []
+        NameIndexEntry.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0004_phone_digits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=32)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('kind', models.CharField(choices=[('user', 'User'), ('contact', 'Contact')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('owner_id', models.BigIntegerField(null=True)),
+                ('phone_digits', models.CharField(blank=True, default='', max_length=32)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='contacts_na_kind_0ef9b5_idx')],
+            },
+        ),
+        migrations.RunPython(populate_name_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contacts', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contact_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['owner', 'updated_at'], name='contacts_co_owner_i_b8a478_idx'),
+        ),
+        migrations.AddField(
+            model_name='contacttombstone',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contact_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='contacttombstone',
+            index=models.Index(fields=['owner', 'deleted_at'], name='contacts_co_owner_i_eb0198_idx'),
+        ),
+    ]
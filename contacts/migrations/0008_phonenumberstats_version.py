@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0007_contact_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phonenumberstats',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:47
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def populate_spam_scores(apps, schema_editor):
+    # Existing reports have weight 1 and start decaying from now; run
+    # rebuild_phone_stats to decay them from their report dates instead
+    PhoneNumberStats = apps.get_model('contacts', 'PhoneNumberStats')
+    PhoneNumberStats.objects.update(spam_score=F('spam_count'), scored_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0008_phonenumberstats_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phonenumberstats',
+            name='scored_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='phonenumberstats',
+            name='spam_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='spamreport',
+            name='weight',
+            field=models.FloatField(default=1.0, editable=False),
+        ),
+        migrations.RunPython(populate_spam_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-18 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0010_contact_sharding'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['owner', 'name'], name='contacts_co_owner_i_1287e0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_number'], name='contacts_co_phone_n_6d0af4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spamreport',
+            index=models.Index(fields=['phone_number', 'reported_at'], name='contacts_sp_phone_n_452216_idx'),
+        ),
+    ]
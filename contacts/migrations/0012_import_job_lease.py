@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0011_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='lease_token',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contacts', '0013_contact_owner_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nameindexentry',
+            index=models.Index(fields=['kind', 'term'], name='contacts_na_kind_da8572_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nameindexentry',
+            index=models.Index(fields=['kind', 'owner_id', 'term'], name='contacts_na_kind_790a67_idx'),
+        ),
+    ]
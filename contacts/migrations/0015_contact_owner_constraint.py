@@ -0,0 +1,21 @@
+# Generated by Django 4.2.11 on 2026-10-18 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contacts', '0014_name_index_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contact',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
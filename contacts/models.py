@@ -1,25 +1,87 @@
-from django.db import models
+import heapq
+import time
+from itertools import groupby
+from operator import itemgetter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.utils import timezone
+from django.db.models import Count, F
+from django.db.models.functions import Collate
 from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
 from phonenumber_field.modelfields import PhoneNumberField
+from caller_id.stampede import add_many_fresh
+from .bloom import add_reported_number
+from .scoring import get_scorer
+from .sharding import assign_contact_ids, contact_databases, contact_db_for_owner, count_contacts_by_phone_number, is_sharded
+from .utils import normalize_phone_number, phone_digits, set_phone_digits, name_terms, spam_cache_key
+
+class ContactQuerySet(models.QuerySet):
+    """
+    Contact queries. With sharding a query has to name its database:
+    for_owner() for one owner's contacts, using() or db_manager() for a
+    shard, or scatter_gather() across all of them. Queries that do none
+    of these raise UnroutedContactQuery.
+    """
+    def for_owner(self, owner):
+        """Contacts of owner (a user or user id), on the owner's shard"""
+        owner_id = getattr(owner, 'pk', owner)
+        queryset = self.filter(owner_id=owner_id)
+        if self._db is None and is_sharded():
+            queryset = queryset.using(contact_db_for_owner(owner_id))
+        return queryset
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        # Saved without a database, so the router sees the new contact's owner
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
 
 class Contact(models.Model):
     """
     Contact model for storing user's contacts with name and phone number.
     Each contact is associated with a user (owner).
     """
-    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contacts')
+    # No index of its own: unique_together and the (owner, ...) indexes cover it.
+    # Contact shards get no foreign key constraint (see contacts/sharding.py)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contacts', db_index=False)
     name = models.CharField(max_length=100)
     phone_number = PhoneNumberField()
+    phone_digits = models.CharField(max_length=32, db_index=True, editable=False, default='')
+    phone_digits_reversed = models.CharField(max_length=32, db_index=True, editable=False, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('owner', 'phone_number')
         ordering = ['name']
+        indexes = [
+            # Delta sync scans a user's contacts by modification time
+            models.Index(fields=['owner', 'updated_at']),
+            # Contact list and export read a user's contacts in name order
+            models.Index(fields=['owner', 'name']),
+            # Contact counts per number for spam statistics
+            models.Index(fields=['phone_number']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone_number})"
 
+    objects = ContactQuerySet.as_manager()
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if self._state.adding and self.pk is None and is_sharded():
+            # Ids come from a sequence shared by the shards. A new row with
+            # its id set is inserted directly; Django would try an UPDATE first
+            assign_contact_ids([self])
+            force_insert = True
+        super().save(force_insert, force_update, using, update_fields)
+
 class SpamReport(models.Model):
     """
     SpamReport model for tracking spam phone numbers.
@@ -27,11 +89,748 @@ class SpamReport(models.Model):
     """
     reporter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spam_reports')
     phone_number = PhoneNumberField()
+    phone_digits = models.CharField(max_length=32, db_index=True, editable=False, default='')
+    phone_digits_reversed = models.CharField(max_length=32, db_index=True, editable=False, default='')
+    # Set from the scorer when the report is created
+    weight = models.FloatField(default=1.0, editable=False)
     reported_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('reporter', 'phone_number')
         ordering = ['-reported_at']
+        indexes = [
+            # Report counts and decayed scores per number
+            models.Index(fields=['phone_number', 'reported_at']),
+        ]
 
     def __str__(self):
         return f"Spam report for {self.phone_number} by {self.reporter.username}"
+
+class ContactTombstone(models.Model):
+    """
+    Record of a deleted contact, so clients syncing changes can
+    remove it from their local copy.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='contact_tombstones')
+    contact_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"Deleted contact {self.contact_id} of {self.owner.username}"
+
+class IdSequence(models.Model):
+    """
+    Named counter handing out ids, for rows whose ids must be unique
+    across databases (contacts spread over shards).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+    @classmethod
+    def allocate(cls, name, count=1, start_after=0):
+        """
+        Reserve count consecutive ids from the named sequence; returns them
+        as a range. start_after (a value or a callable) is where a new
+        sequence starts.
+        """
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            sequence, _ = cls.objects.using(DEFAULT_DB_ALIAS).select_for_update().get_or_create(
+                name=name, defaults={'last_value': start_after}
+            )
+            cls.objects.using(DEFAULT_DB_ALIAS).filter(pk=sequence.pk).update(last_value=F('last_value') + count)
+        return range(sequence.last_value + 1, sequence.last_value + count + 1)
+
+# Collations that sort text by code point, as Python compares strings
+BINARY_COLLATIONS = {'sqlite': 'BINARY', 'postgresql': 'C'}
+
+def code_point_order(field, alias):
+    """
+    Ordering expression for field on database alias (None for the default
+    database) that matches Python string ordering, whatever the column's
+    default collation.
+    """
+    collation = BINARY_COLLATIONS.get(connections[alias or DEFAULT_DB_ALIAS].vendor)
+    return Collate(F(field), collation) if collation else F(field)
+
+def count_by_phone_number(queryset):
+    """
+    Count rows of a queryset grouped by phone number in a single query.
+    Returns a dict mapping E.164 strings to counts.
+    """
+    rows = queryset.order_by().values('phone_number').annotate(total=Count('id'))
+    return {
+        normalize_phone_number(row['phone_number']): row['total']
+        for row in rows
+    }
+
+async def acount_by_phone_number(queryset):
+    """Async count_by_phone_number"""
+    rows = queryset.order_by().values('phone_number').annotate(total=Count('id'))
+    return {
+        normalize_phone_number(row['phone_number']): row['total']
+        async for row in rows.aiterator()
+    }
+
+def build_spam_stats(spam_count, contact_count, spam_score=None, scored_at=None, version=0, updated_at=None):
+    """
+    Build the statistics entry returned (and cached) for a single phone number.
+    spam_score and scored_at are the scorer's accumulator, from which the
+    likelihood is recomputed at read time. version and updated_at come from
+    the number's stats row and identify this state of the entry for
+    conditional requests.
+    """
+    if spam_score is None:
+        spam_score = float(spam_count)
+    return {
+        'spam_reports': spam_count,
+        'contact_entries': contact_count,
+        'spam_likelihood': get_scorer().current_likelihood(spam_score, scored_at, contact_count),
+        'spam_score': spam_score,
+        'scored_at': scored_at,
+        'version': version,
+        'updated_at': updated_at,
+    }
+
+def cache_spam_stats(numbers):
+    """
+    Load the stats rows of numbers into the cache once the surrounding
+    transaction commits. Rows are read after the commit and only added
+    for numbers without a cached entry, so a write that commits first
+    is never overwritten with older statistics.
+    """
+    numbers = list(numbers)
+
+    def load():
+        rows = PhoneNumberStats.objects.filter(phone_number__in=numbers)
+        add_many_fresh(
+            {spam_cache_key(normalize_phone_number(row.phone_number)): row.to_stats() for row in rows},
+            settings.SPAM_STATS_CACHE_TIMEOUT
+        )
+
+    if numbers:
+        transaction.on_commit(load)
+
+def invalidate_spam_stats(numbers, batch_size=1000):
+    """Drop cached spam statistics for numbers once the surrounding transaction commits"""
+    keys = [spam_cache_key(number) for number in numbers]
+
+    def delete_keys():
+        for start in range(0, len(keys), batch_size):
+            cache.delete_many(keys[start:start + batch_size])
+
+    if keys:
+        transaction.on_commit(delete_keys)
+
+SEARCH_GENERATION_KEY = 'search_generation_'
+SEARCH_NAME = 'name'
+SEARCH_PHONE = 'phone'
+
+def search_generation(kind, scope=None):
+    """
+    Current generation of a shared search cache; part of its cache keys.
+    With a scope (see phone_search_scope) the scope's own generation is
+    included, so invalidating the scope drops only its entries.
+    """
+    keys = [f'{SEARCH_GENERATION_KEY}{kind}']
+    if scope is not None:
+        keys.append(f'{SEARCH_GENERATION_KEY}{kind}_{scope}')
+    generations = cache.get_many(keys)
+    return '.'.join(str(generations.get(key, 0)) for key in keys)
+
+def invalidate_search_cache(*kinds):
+    """Start a new generation of the given shared search caches once the transaction commits"""
+    def bump():
+        # A timestamp never repeats an earlier generation, even after eviction
+        cache.set_many({f'{SEARCH_GENERATION_KEY}{kind}': time.time_ns() for kind in kinds}, None)
+
+    transaction.on_commit(bump)
+
+def phone_search_scope(phone_lookup):
+    """
+    Scope of a phone search lookup built by SearchView._phone_lookup: 'p'
+    and the leading digits it matches, or 's' and the trailing digits
+    reversed. Returns None for any other lookup.
+    """
+    for lookup, value in phone_lookup.items():
+        if lookup in ('phone_digits', 'phone_digits__gte'):
+            return f'p{value}'
+        if lookup == 'phone_digits_reversed__gte':
+            return f's{value}'
+    return None
+
+def phone_search_scopes(number):
+    """Scopes of every phone search that matches number: one per prefix and suffix of its digits"""
+    digits = phone_digits(number)
+    reversed_digits = digits[::-1]
+    return [f'p{digits[:end]}' for end in range(1, len(digits) + 1)] + [
+        f's{reversed_digits[:end]}' for end in range(1, len(digits) + 1)
+    ]
+
+def invalidate_phone_search(numbers):
+    """
+    Start a new generation of the shared phone searches that match any of
+    numbers once the transaction commits. A generation only has to outlive
+    the entries cached under the previous one, so it expires with them.
+    """
+    keys = {
+        f'{SEARCH_GENERATION_KEY}{SEARCH_PHONE}_{scope}'
+        for number in numbers if number
+        for scope in phone_search_scopes(number)
+    }
+
+    def bump():
+        generation = time.time_ns()
+        cache.set_many(
+            dict.fromkeys(keys, generation), settings.SEARCH_CACHE_TIMEOUT + settings.CACHE_STALE_TIMEOUT
+        )
+
+    if keys:
+        transaction.on_commit(bump)
+
+class PhoneNumberStats(models.Model):
+    """
+    Denormalized spam statistics for a phone number.
+    Kept current by signal handlers on Contact and SpamReport so spam
+    likelihood can be read without counting report rows on every request.
+    spam_score is the configured scorer's accumulator as of scored_at; new
+    and deleted reports adjust it without rescanning older reports.
+    version is bumped on every recompute and is never reset, so a
+    (phone_number, version) pair always identifies the same statistics.
+    """
+    phone_number = PhoneNumberField(unique=True)
+    spam_count = models.PositiveIntegerField(default=0)
+    contact_count = models.PositiveIntegerField(default=0)
+    spam_score = models.FloatField(default=0.0)
+    scored_at = models.DateTimeField(null=True)
+    # Likelihood as of scored_at
+    likelihood = models.FloatField(default=0.0)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'phone number stats'
+
+    def __str__(self):
+        return f"{self.phone_number}: {self.likelihood}% spam"
+
+    def to_stats(self):
+        """Statistics entry for this row, as returned by build_spam_stats"""
+        return build_spam_stats(
+            self.spam_count, self.contact_count, self.spam_score, self.scored_at,
+            self.version, self.updated_at
+        )
+
+    @classmethod
+    def refresh(cls, phone_numbers, batch_size=500, score_changes=(), rescore=False):
+        """
+        Recompute the stats rows for the given phone numbers from the
+        Contact and SpamReport tables. Rows of numbers with no references
+        left are kept with zero counts so their version keeps increasing.
+
+        score_changes are (phone_number, weight, reported_at) tuples for
+        reports added (positive weight) or removed (negative weight) since
+        the last refresh; they are applied to the stored spam score. With
+        rescore the score is instead recomputed from every report.
+        """
+        numbers = {normalize_phone_number(number) for number in phone_numbers}
+        numbers.discard(None)
+        numbers = sorted(numbers)
+
+        changes = {}
+        for number, weight, reported_at in score_changes:
+            changes.setdefault(normalize_phone_number(number), []).append((weight, reported_at))
+
+        for start in range(0, len(numbers), batch_size):
+            cls._refresh_batch(numbers[start:start + batch_size], changes, rescore)
+
+    @classmethod
+    def _refresh_batch(cls, numbers, changes, rescore):
+        scorer = get_scorer()
+        now = timezone.now()
+        rows = []
+
+        with transaction.atomic():
+            # Lock existing rows so concurrent refreshes apply their score
+            # changes one after the other
+            current = {
+                normalize_phone_number(row.phone_number): row
+                for row in cls.objects.select_for_update().filter(phone_number__in=numbers).only(
+                    'phone_number', 'spam_score', 'scored_at'
+                )
+            }
+            spam_counts = count_by_phone_number(SpamReport.objects.filter(phone_number__in=numbers))
+            contact_counts = count_contacts_by_phone_number(numbers)
+            if rescore:
+                scores = cls._scores_from_reports(SpamReport.objects.filter(phone_number__in=numbers), now)
+
+            for number in numbers:
+                existing = current.get(number)
+                spam_count = spam_counts.get(number, 0)
+                contact_count = contact_counts.get(number, 0)
+                if existing is None and spam_count == 0 and contact_count == 0:
+                    # Never referenced: nothing to store
+                    continue
+
+                if rescore:
+                    spam_score = scores.get(number, 0.0)
+                else:
+                    spam_score = 0.0
+                    if existing is not None and existing.scored_at is not None:
+                        spam_score = scorer.decay(existing.spam_score, existing.scored_at, now)
+                    for weight, reported_at in changes.get(number, ()):
+                        spam_score += scorer.decay(weight, reported_at, now)
+                # Drop rounding residue once the last report is gone
+                spam_score = max(spam_score, 0.0) if spam_count else 0.0
+
+                row = cls(
+                    phone_number=number,
+                    spam_count=spam_count,
+                    contact_count=contact_count,
+                    spam_score=spam_score,
+                    scored_at=now,
+                    likelihood=scorer.likelihood(spam_score, contact_count),
+                    updated_at=now,
+                )
+                rows.append(row)
+
+            cls._upsert(rows)
+            # Dropped rather than rewritten: a concurrent refresh committing
+            # first must not have its entry replaced by these older counts
+            invalidate_spam_stats(numbers)
+
+    @classmethod
+    def _upsert(cls, rows):
+        """
+        Insert or update stats rows and bump their versions. New rows are
+        inserted at version 0 and every written row is then incremented in
+        the database, so concurrent writers never hand out the same version.
+        """
+        if not rows:
+            return
+        cls.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['phone_number'],
+            update_fields=['spam_count', 'contact_count', 'spam_score', 'scored_at',
+                           'likelihood', 'updated_at'],
+        )
+        cls.objects.filter(phone_number__in=[row.phone_number for row in rows]).update(
+            version=F('version') + 1
+        )
+
+    @staticmethod
+    def _scores_from_reports(queryset, now):
+        """Spam scores as of now, summed over every report in queryset"""
+        scorer = get_scorer()
+        scores = {}
+        reports = queryset.values_list('phone_number', 'weight', 'reported_at').iterator(chunk_size=2000)
+        for phone_number, weight, reported_at in reports:
+            number = normalize_phone_number(phone_number)
+            scores[number] = scores.get(number, 0.0) + scorer.decay(weight, reported_at, now)
+        return scores
+
+    @classmethod
+    def rebuild(cls, batch_size=1000, warm_cache=False):
+        """
+        Recompute every stats row from the source tables in one streaming
+        pass. Spam reports are read in phone number order and folded into
+        per-number counts and scores, merged with a grouped count of
+        contacts and upserted batch_size rows at a time, each batch in its
+        own transaction, so memory use does not grow with the tables and
+        readers never see the stats table empty. Rows of numbers with no
+        references left get zero counts. Versions are carried forward, and
+        rows refreshed after the rebuild started are left as they are.
+        With warm_cache the rebuilt entries are added to the cache for
+        numbers without a cached entry, otherwise the cached entries are
+        dropped.
+        Returns the number of rows written.
+        """
+        started_at = timezone.now()
+        total = 0
+        batch = []
+        for stats in cls._stream_stats(started_at):
+            batch.append(stats)
+            if len(batch) >= batch_size:
+                total += cls._write_rebuilt(batch, started_at, warm_cache)
+                batch = []
+        if batch:
+            total += cls._write_rebuilt(batch, started_at, warm_cache)
+        return total + cls._clear_unreferenced(started_at, batch_size)
+
+    @staticmethod
+    def _stream_stats(now, chunk_size=2000):
+        """
+        Yield (phone_number, spam_count, spam_score, contact_count) for every
+        referenced number, in number order. The streams are merged in Python,
+        so they are sorted by code point; stored numbers are already E.164,
+        so normalizing them keeps that order.
+        """
+        scorer = get_scorer()
+
+        def reports():
+            rows = SpamReport.objects.order_by(
+                code_point_order('phone_number', router.db_for_read(SpamReport))
+            ).values_list(
+                'phone_number', 'weight', 'reported_at'
+            ).iterator(chunk_size=chunk_size)
+            for phone_number, group in groupby(rows, key=itemgetter(0)):
+                spam_count = 0
+                spam_score = 0.0
+                for _, weight, reported_at in group:
+                    spam_count += 1
+                    spam_score += scorer.decay(weight, reported_at, now)
+                yield normalize_phone_number(phone_number), 'reports', (spam_count, spam_score)
+
+        def contacts():
+            # One ordered stream per shard, summed per number
+            streams = [
+                (
+                    (normalize_phone_number(phone_number), total)
+                    for phone_number, total in Contact.objects.db_manager(alias).order_by(
+                        code_point_order('phone_number', alias)
+                    ).values('phone_number').annotate(
+                        total=Count('id')
+                    ).values_list('phone_number', 'total').iterator(chunk_size=chunk_size)
+                )
+                for alias in contact_databases()
+            ]
+            for number, group in groupby(heapq.merge(*streams, key=itemgetter(0)), key=itemgetter(0)):
+                yield number, 'contacts', sum(total for _, total in group)
+
+        merged = heapq.merge(reports(), contacts(), key=itemgetter(0))
+        for number, items in groupby(merged, key=itemgetter(0)):
+            values = {kind: value for _, kind, value in items}
+            spam_count, spam_score = values.get('reports', (0, 0.0))
+            yield number, spam_count, spam_score, values.get('contacts', 0)
+
+    @classmethod
+    def _write_rebuilt(cls, batch, now, warm_cache):
+        """
+        Write a batch of rebuilt stats. Rows updated since the rebuild
+        started at now were refreshed from later data and are left alone:
+        existing rows are locked and checked before they are overwritten,
+        and new rows are only inserted if no refresh has inserted them.
+        Returns the number of rows written.
+        """
+        scorer = get_scorer()
+        numbers = [number for number, _, _, _ in batch]
+        with transaction.atomic():
+            updated = {
+                normalize_phone_number(number): updated_at
+                for number, updated_at in cls.objects.select_for_update().filter(
+                    phone_number__in=numbers
+                ).values_list('phone_number', 'updated_at')
+            }
+            stale = []
+            new = []
+            for number, spam_count, spam_score, contact_count in batch:
+                if number in updated and updated[number] >= now:
+                    continue
+                row = cls(
+                    phone_number=number,
+                    spam_count=spam_count,
+                    contact_count=contact_count,
+                    spam_score=spam_score,
+                    scored_at=now,
+                    likelihood=scorer.likelihood(spam_score, contact_count),
+                    version=1,
+                    updated_at=now,
+                )
+                (stale if number in updated else new).append(row)
+            cls._upsert(stale)
+            cls.objects.bulk_create(new, ignore_conflicts=True)
+            if warm_cache:
+                cache_spam_stats(numbers)
+            else:
+                invalidate_spam_stats(numbers)
+        return len(stale) + len(new)
+
+    @classmethod
+    def _clear_unreferenced(cls, started_at, batch_size):
+        """Zero the rows a rebuild started at started_at did not write; returns how many"""
+        # Rows written since started_at were rebuilt or refreshed by a signal
+        stale = cls.objects.filter(updated_at__lt=started_at).exclude(spam_count=0, contact_count=0)
+        total = 0
+        while True:
+            chunk = list(stale.values_list('pk', 'phone_number')[:batch_size])
+            if not chunk:
+                return total
+            with transaction.atomic():
+                now = timezone.now()
+                cls.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                    spam_count=0, contact_count=0, spam_score=0.0, scored_at=now, likelihood=0.0,
+                    version=F('version') + 1, updated_at=now
+                )
+                invalidate_spam_stats([number for _, number in chunk])
+            total += len(chunk)
+
+class NameIndexEntry(models.Model):
+    """
+    Lowercase name suffix pointing at a registered user or a contact.
+    Name search runs as a single indexed prefix scan over this table,
+    ranked by RANK_* so names starting with the query come first.
+    """
+    KIND_USER = 'user'
+    KIND_CONTACT = 'contact'
+    KIND_CHOICES = [(KIND_USER, 'User'), (KIND_CONTACT, 'Contact')]
+
+    RANK_USER_STARTS_WITH = 0
+    RANK_CONTACT_STARTS_WITH = 1
+    RANK_USER_CONTAINS = 2
+    RANK_CONTACT_CONTAINS = 3
+
+    term = models.CharField(max_length=32, db_index=True)
+    rank = models.PositiveSmallIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Only set for contacts: used to restrict results to the searcher's
+    # contacts and to hide contacts whose number belongs to a matched user
+    owner_id = models.BigIntegerField(null=True)
+    phone_digits = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id']),
+            # Name search: a term range over registered users, and over
+            # the searcher's own contacts
+            models.Index(fields=['kind', 'term']),
+            models.Index(fields=['kind', 'owner_id', 'term']),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.kind} {self.object_id}"
+
+    @classmethod
+    def _entries_for(cls, kind, object_id, names, starts_with_rank, contains_rank, **extra):
+        entries = []
+        for name in names:
+            for position, term in enumerate(name_terms(name)):
+                entries.append(cls(
+                    term=term,
+                    rank=starts_with_rank if position == 0 else contains_rank,
+                    kind=kind,
+                    object_id=object_id,
+                    **extra
+                ))
+        return entries
+
+    @classmethod
+    def entries_for_user(cls, user):
+        """Index entries for a registered user's first and last name"""
+        return cls._entries_for(
+            cls.KIND_USER, user.pk, [user.first_name, user.last_name],
+            cls.RANK_USER_STARTS_WITH, cls.RANK_USER_CONTAINS
+        )
+
+    @classmethod
+    def entries_for_contact(cls, contact):
+        """Index entries for a contact's name"""
+        return cls._entries_for(
+            cls.KIND_CONTACT, contact.pk, [contact.name],
+            cls.RANK_CONTACT_STARTS_WITH, cls.RANK_CONTACT_CONTAINS,
+            owner_id=contact.owner_id, phone_digits=contact.phone_digits
+        )
+
+    @classmethod
+    def reindex(cls, kind, obj):
+        """Replace the index entries of a single user or contact"""
+        cls.objects.filter(kind=kind, object_id=obj.pk).delete()
+        if kind == cls.KIND_USER:
+            entries = cls.entries_for_user(obj)
+        else:
+            entries = cls.entries_for_contact(obj)
+        cls.objects.bulk_create(entries)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """
+        Drop and rebuild the whole name index.
+        Returns the number of entries written.
+        """
+        cls.objects.all().delete()
+        total = 0
+        for queryset, entries_for in [
+            (User.objects.only('id', 'first_name', 'last_name'), cls.entries_for_user),
+        ] + [
+            (Contact.objects.db_manager(alias).only('id', 'name', 'owner_id', 'phone_digits'), cls.entries_for_contact)
+            for alias in contact_databases()
+        ]:
+            batch = []
+            for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+                batch.extend(entries_for(obj))
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch, batch_size=batch_size)
+                    total += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch, batch_size=batch_size)
+            total += len(batch)
+        return total
+
+class ImportJob(models.Model):
+    """
+    Background contact import submitted by a user.
+    The payload is stored with the job and drained in chunks by a worker,
+    while the client polls the counters for progress. The worker holds the
+    job under lease_token and renews the lease (updated_at) with every
+    chunk; a running job whose lease is older than IMPORT_JOB_LEASE_TIMEOUT
+    seconds is taken over by another worker.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    payload = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    failures = models.JSONField(default=list)
+    error = models.TextField(blank=True, default='')
+    lease_token = models.UUIDField(null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Import job {self.pk} ({self.status}) for {self.owner.username}"
+
+@receiver(pre_save, sender=Contact)
+@receiver(pre_save, sender=SpamReport)
+def populate_phone_digits(sender, instance, **kwargs):
+    """
+    Signal handler to fill the indexed digits-only lookup columns.
+    """
+    set_phone_digits(instance)
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_contacts(sender, instance, **kwargs):
+    """
+    Signal handler to delete a user's contacts from their shard. The
+    cascade only covers the user's own database.
+    """
+    if is_sharded() and contact_db_for_owner(instance.pk) != instance._state.db:
+        Contact.objects.for_owner(instance).delete()
+
+@receiver(pre_save, sender=SpamReport)
+def set_report_weight(sender, instance, **kwargs):
+    """
+    Signal handler to weight a new report by its reporter's reputation.
+    """
+    if instance.pk is None:
+        instance.weight = get_scorer().report_weight(instance.reporter)
+
+@receiver(pre_save, sender=Contact)
+@receiver(pre_save, sender=SpamReport)
+def remember_previous_phone_number(sender, instance, **kwargs):
+    """
+    Signal handler to remember the stored phone number before an update,
+    so the stats of a number that was changed away from are refreshed too.
+    """
+    instance._previous_phone_number = None
+    if instance.pk and not instance._state.adding:
+        instance._previous_phone_number = sender.objects.db_manager(
+            instance._state.db, hints={'instance': instance}
+        ).filter(pk=instance.pk).values_list('phone_number', flat=True).first()
+
+@receiver(post_save, sender=Contact)
+@receiver(post_save, sender=SpamReport)
+@receiver(post_delete, sender=Contact)
+@receiver(post_delete, sender=SpamReport)
+def update_phone_number_stats(sender, instance, **kwargs):
+    """
+    Signal handler to keep PhoneNumberStats current when a Contact or
+    SpamReport is saved or deleted.
+    """
+    numbers = [instance.phone_number]
+    previous = getattr(instance, '_previous_phone_number', None)
+    if previous:
+        numbers.append(previous)
+
+    score_changes = []
+    if sender is SpamReport:
+        if kwargs['signal'] is post_delete:
+            score_changes.append((instance.phone_number, -instance.weight, instance.reported_at))
+        elif kwargs.get('created'):
+            score_changes.append((instance.phone_number, instance.weight, instance.reported_at))
+        elif previous and normalize_phone_number(previous) != normalize_phone_number(instance.phone_number):
+            score_changes.append((previous, -instance.weight, instance.reported_at))
+            score_changes.append((instance.phone_number, instance.weight, instance.reported_at))
+    PhoneNumberStats.refresh(numbers, score_changes=score_changes)
+
+@receiver(post_save, sender=SpamReport)
+def add_reported_number_to_filter(sender, instance, **kwargs):
+    """
+    Signal handler to record a reported number in the reported-numbers
+    filter. Done before commit: a rolled back report only costs a false
+    positive, while a late add could hide a real report.
+    """
+    add_reported_number(normalize_phone_number(instance.phone_number))
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender='users.UserProfile')
+def invalidate_shared_search(sender, instance, **kwargs):
+    """
+    Signal handler to drop cached shared search results. Contacts only
+    appear in the shared part of phone searches, so only the searches
+    matching their old and new numbers are dropped; users and their
+    profiles appear in both.
+    """
+    if sender is Contact:
+        invalidate_phone_search([instance.phone_number, getattr(instance, '_previous_phone_number', None)])
+        return
+    update_fields = kwargs.get('update_fields')
+    if sender is User and update_fields and not {'first_name', 'last_name', 'email'} & set(update_fields):
+        return
+    invalidate_search_cache(SEARCH_NAME, SEARCH_PHONE)
+
+@receiver(post_save, sender=Contact)
+def index_contact_name(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the name index entries of a saved contact.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not {'name', 'owner', 'phone_number'} & set(update_fields):
+        return
+    NameIndexEntry.reindex(NameIndexEntry.KIND_CONTACT, instance)
+
+@receiver(post_save, sender=User)
+def index_user_name(sender, instance, **kwargs):
+    """
+    Signal handler to refresh the name index entries of a saved user.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    NameIndexEntry.reindex(NameIndexEntry.KIND_USER, instance)
+
+@receiver(post_delete, sender=Contact)
+@receiver(post_delete, sender=User)
+def remove_name_index_entries(sender, instance, **kwargs):
+    """
+    Signal handler to drop the name index entries of a deleted user or contact.
+    """
+    kind = NameIndexEntry.KIND_USER if sender is User else NameIndexEntry.KIND_CONTACT
+    NameIndexEntry.objects.filter(kind=kind, object_id=instance.pk).delete()
@@ -0,0 +1,68 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_position(position):
+    """Encode a keyset position dict as an opaque URL-safe token"""
+    return urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+
+def decode_position(encoded):
+    """Decode a token from encode_position, raising ValueError if it is malformed"""
+    try:
+        position = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Malformed token: {e}')
+    if not isinstance(position, dict):
+        raise ValueError('Malformed token')
+    return position
+
+
+class SearchCursorPagination:
+    """
+    Keyset pagination for search results.
+    The cursor is an opaque encoding of the last position returned, so each
+    page is fetched with a "greater than position" filter and a limit
+    instead of materializing and slicing the full result list.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        """Page size from the query string, capped at SEARCH_MAX_PAGE_SIZE"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.SEARCH_PAGE_SIZE
+        return max(1, min(page_size, settings.SEARCH_MAX_PAGE_SIZE))
+
+    def decode_cursor(self, request):
+        """Return the position encoded in the request cursor, or None for the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return decode_position(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        return encode_position(position)
+
+    def get_next_link(self, request, position):
+        if position is None:
+            return None
+        return replace_query_param(
+            request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(position)
+        )
+
+    def get_paginated_response(self, request, data, next_position):
+        return Response({
+            'next': self.get_next_link(request, next_position),
+            'results': data
+        })
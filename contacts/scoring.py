@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class SpamScorer:
+    """
+    Base class for spam scorers, selected with the SPAM_SCORER setting.
+
+    A number's spam score is the sum of its reports' weights. It is stored
+    as one accumulator plus the time it was last brought up to date, so a
+    new report is folded in with O(1) work: decay the accumulator to now
+    and add the report's weight. Likelihood compares the score with the
+    number of contact entries for the number.
+    """
+    def report_weight(self, reporter):
+        """Weight given to a report made by reporter"""
+        return 1.0
+
+    def decay(self, value, since, until):
+        """Value of a score contribution made at since, as of until"""
+        return value
+
+    def likelihood(self, spam_score, contact_count):
+        """Spam likelihood percentage for an up to date score"""
+        total = spam_score + contact_count
+        if total <= 0:
+            return 0.0
+        return round((spam_score / total) * 100, 2)
+
+    def current_likelihood(self, spam_score, scored_at, contact_count, now=None):
+        """Spam likelihood for a score last brought up to date at scored_at"""
+        if scored_at is not None:
+            spam_score = self.decay(spam_score, scored_at, now or timezone.now())
+        return self.likelihood(spam_score, contact_count)
+
+
+class RatioScorer(SpamScorer):
+    """
+    Every report counts once and forever: likelihood is
+    spam_reports / (spam_reports + contact_entries).
+    """
+
+
+class DecayedScorer(SpamScorer):
+    """
+    Reports are weighted by their reporter's reputation and lose half of
+    their weight every SPAM_SCORE_HALF_LIFE seconds, so old reports stop
+    dominating a number's score.
+    """
+    def report_weight(self, reporter):
+        try:
+            return max(reporter.profile.reputation, 0.0)
+        except ObjectDoesNotExist:
+            return 1.0
+
+    def decay(self, value, since, until):
+        elapsed = (until - since).total_seconds()
+        if elapsed <= 0:
+            return value
+        return value * 0.5 ** (elapsed / settings.SPAM_SCORE_HALF_LIFE)
+
+
+_scorers = {}
+
+
+def get_scorer():
+    """The scorer configured by SPAM_SCORER"""
+    path = settings.SPAM_SCORER
+    scorer = _scorers.get(path)
+    if scorer is None:
+        scorer = _scorers[path] = import_string(path)()
+    return scorer
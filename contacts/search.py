@@ -0,0 +1,317 @@
+import hashlib
+import json
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Min, Q
+from django.db.models.functions import Lower
+from caller_id.stampede import get_or_compute_many
+from users.models import UserProfile
+from .models import Contact, NameIndexEntry, SEARCH_NAME, SEARCH_PHONE, phone_search_scope, search_generation
+from .sharding import is_sharded, scatter_gather
+from .utils import NAME_TERM_MAX_LENGTH, prefix_range
+
+User = get_user_model()
+
+
+
+def search_name_index(user, query, limit, after=None):
+    """
+    Rank registered users and the user's contacts whose name matches query.
+    Runs one indexed prefix scan over NameIndexEntry, grouped per object and
+    ordered by best rank: users starting with the query, contacts starting
+    with it, then users and contacts containing it. Contacts sharing a
+    number with a matched registered user are left out.
+    after is an optional (rank, object_id) keyset position to continue from.
+    Returns a list of (kind, object_id, rank) tuples.
+    """
+    term = query.strip().lower()[:NAME_TERM_MAX_LENGTH]
+    if not term:
+        return []
+    lower, upper = prefix_range(term)
+
+    matches = NameIndexEntry.objects.filter(term__gte=lower, term__lt=upper)
+    registered_digits = UserProfile.objects.filter(
+        user_id__in=matches.filter(kind=NameIndexEntry.KIND_USER).values('object_id')
+    ).values('phone_digits')
+
+    rows = matches.filter(
+        Q(kind=NameIndexEntry.KIND_USER) | Q(kind=NameIndexEntry.KIND_CONTACT, owner_id=user.pk)
+    ).exclude(
+        kind=NameIndexEntry.KIND_CONTACT, phone_digits__in=registered_digits
+    ).values('kind', 'object_id').annotate(
+        best_rank=Min('rank')
+    )
+    if after is not None:
+        rank, object_id = after
+        rows = rows.filter(
+            Q(best_rank__gt=rank) | Q(best_rank=rank, object_id__gt=object_id)
+        )
+    rows = rows.order_by('best_rank', 'object_id')[:limit]
+
+    return [(row['kind'], row['object_id'], row['best_rank']) for row in rows]
+
+
+def contact_name_rows(user, query, after=None, exclude_digits=None):
+    """
+    Queryset of the user's contacts whose name matches query, ranked like
+    search_name_index but without registered users, or None for an empty
+    query. Contacts whose number is in exclude_digits (a list or a
+    subquery) are left out.
+    """
+    term = query.strip().lower()[:NAME_TERM_MAX_LENGTH]
+    if not term:
+        return None
+    lower, upper = prefix_range(term)
+
+    rows = NameIndexEntry.objects.filter(
+        term__gte=lower, term__lt=upper, kind=NameIndexEntry.KIND_CONTACT, owner_id=user.pk
+    )
+    # A subquery must not be evaluated here, so test for None rather than truth
+    if exclude_digits is not None:
+        rows = rows.exclude(phone_digits__in=exclude_digits)
+    rows = rows.values('kind', 'object_id').annotate(best_rank=Min('rank'))
+    if after is not None:
+        rank, object_id = after
+        rows = rows.filter(
+            Q(best_rank__gt=rank) | Q(best_rank=rank, object_id__gt=object_id)
+        )
+    return rows.order_by('best_rank', 'object_id')
+
+
+def search_contacts_by_name(user, query, limit, after=None, exclude_digits=None):
+    """
+    Rank the user's contacts whose name matches query (see contact_name_rows).
+    Returns a list of (kind, object_id, rank) tuples.
+    """
+    rows = contact_name_rows(user, query, after, exclude_digits)
+    if rows is None:
+        return []
+    return [(row['kind'], row['object_id'], row['best_rank']) for row in rows[:limit]]
+
+
+async def asearch_contacts_by_name(user, query, limit, after=None, exclude_digits=None):
+    """Async search_contacts_by_name"""
+    rows = contact_name_rows(user, query, after, exclude_digits)
+    if rows is None:
+        return []
+    return [(row['kind'], row['object_id'], row['best_rank']) async for row in rows[:limit]]
+
+
+def registered_digits(query):
+    """
+    Subquery of the phone digits of registered users matching query's
+    index term, the numbers whose contacts are hidden from name results.
+    """
+    lower, upper = prefix_range(query.strip().lower()[:NAME_TERM_MAX_LENGTH])
+    return UserProfile.objects.filter(
+        user_id__in=NameIndexEntry.objects.filter(
+            term__gte=lower, term__lt=upper, kind=NameIndexEntry.KIND_USER
+        ).values('object_id')
+    ).exclude(phone_digits='').values('phone_digits')
+
+
+def merge_name_matches(shared, contact_matches, after, limit):
+    """
+    Merge the cached registered users of shared_name_matches with the
+    searcher's own contact matches in name index order, keeping the first
+    limit matches after the keyset position after.
+    """
+    matches = [
+        (NameIndexEntry.KIND_USER, result['id'], rank) for rank, result in shared['users']
+        if after is None or (rank, result['id']) > after
+    ][:limit]
+    matches += contact_matches
+    return sorted(matches, key=lambda match: (match[2], match[1]))[:limit]
+
+
+def name_search_page(matches, page_size):
+    """Cut page_size + 1 matches down to one page; returns (matches, next position)"""
+    if len(matches) <= page_size:
+        return matches, None
+    matches = matches[:page_size]
+    kind, object_id, rank = matches[-1]
+    return matches, {'rank': rank, 'id': object_id}
+
+
+def name_search_results(query, matches, user_results, contacts):
+    """
+    Build name search results for matches from the user results (id to
+    result dict) and contacts (id to Contact with its owner) fetched for
+    them. Objects renamed since they were indexed are dropped.
+    """
+    results = []
+    for kind, object_id, rank in matches:
+        if kind == NameIndexEntry.KIND_USER:
+            result = user_results.get(object_id)
+            if result is not None:
+                results.append(dict(result))
+        else:
+            contact = contacts.get(object_id)
+            if contact is None or not name_matches(query, contact.name):
+                continue
+            results.append({
+                'id': contact.id,
+                'name': contact.name,
+                'phone_number': str(contact.phone_number),
+                'email': contact.owner.email if contact.owner else None,
+                'is_registered': False
+            })
+    return results
+
+
+def name_matches(query, *names):
+    """
+    True if query is contained in one of names, ignoring case. Index terms
+    are truncated, so long queries are checked in full with this.
+    """
+    query_lower = query.strip().lower()
+    return any(query_lower in name.lower() for name in names)
+
+
+def cached_page(items, page_size, complete):
+    """
+    Take one page from a cached list of results following the cursor.
+    complete says whether the list holds every result. Returns
+    (page, has_more), or None if the list is cut short before the page ends.
+    """
+    if len(items) > page_size:
+        return items[:page_size], True
+    if complete:
+        return items, False
+    return None
+
+
+def user_search_result(user):
+    return {
+        'id': user.id,
+        'name': f"{user.first_name} {user.last_name}".strip(),
+        'phone_number': str(user.profile.phone_number),
+        'email': user.email,
+        'is_registered': True
+    }
+
+
+def phone_contact_matches(phone_lookup, limit, after_name=None):
+    """
+    Contacts of every user with a number matching phone_lookup, one per
+    lowercase name (the lowest id), in name order after after_name.
+    Sharded contacts are gathered from every shard and merged.
+    Returns up to limit (name_key, contact) pairs with owners loaded.
+    """
+    sharded = is_sharded()
+
+    def query(alias):
+        names = Contact.objects.db_manager(alias).filter(**phone_lookup).annotate(
+            name_key=Lower('name')
+        ).values('name_key').annotate(contact_id=Min('id')).order_by('name_key')
+        if after_name is not None:
+            names = names.filter(name_key__gt=after_name)
+        names = list(names[:limit])
+        contacts = Contact.objects.db_manager(alias)
+        if not sharded:
+            # Owners live in the same database
+            contacts = contacts.select_related('owner')
+        contacts = contacts.in_bulk([row['contact_id'] for row in names])
+        return [(row['name_key'], contacts[row['contact_id']]) for row in names]
+
+    first = {}
+    for matches in scatter_gather(query):
+        for name_key, contact in matches:
+            if name_key not in first or contact.id < first[name_key].id:
+                first[name_key] = contact
+    matches = sorted(first.items())[:limit]
+
+    if sharded:
+        owners = User.objects.in_bulk({contact.owner_id for name_key, contact in matches})
+        for name_key, contact in matches:
+            contact.owner = owners[contact.owner_id]
+    return matches
+
+
+def get_shared_search(kind, key_data, compute, scope=None):
+    """
+    Cached result of compute() for a normalized search, shared by every
+    searcher. scope is passed to search_generation.
+    """
+    digest = hashlib.md5(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f'search_{kind}_{search_generation(kind, scope)}_{digest}'
+    return get_or_compute_many(
+        {key: key}, lambda keys: {key: compute() for key in keys}, settings.SEARCH_CACHE_TIMEOUT
+    )[key]
+
+
+def shared_name_matches(query):
+    """
+    The user-independent part of a name search: registered users whose
+    name matches query, ranked and ordered like search_name_index, plus
+    the phone digits of every user matching the index term (contacts with
+    those numbers are hidden from results).
+    Returns {'complete': bool, 'users': [(rank, result)], 'digits': [...]};
+    complete is False when more than SEARCH_CACHE_MAX_RESULTS users match,
+    in which case the entry must not be used.
+    """
+    query_lower = query.strip().lower()
+
+    def compute():
+        term = query_lower[:NAME_TERM_MAX_LENGTH]
+        lower, upper = prefix_range(term)
+        limit = settings.SEARCH_CACHE_MAX_RESULTS
+        rows = list(NameIndexEntry.objects.filter(
+            term__gte=lower, term__lt=upper, kind=NameIndexEntry.KIND_USER
+        ).values('object_id').annotate(best_rank=Min('rank')).order_by('best_rank', 'object_id')[:limit + 1])
+        if len(rows) > limit:
+            return {'complete': False, 'users': [], 'digits': []}
+
+        users = User.objects.select_related('profile').in_bulk([row['object_id'] for row in rows])
+        matches = []
+        for row in rows:
+            user = users.get(row['object_id'])
+            if user is not None and name_matches(query_lower, user.first_name, user.last_name):
+                matches.append((row['best_rank'], user_search_result(user)))
+        return {
+            'complete': True,
+            'users': matches,
+            'digits': [user.profile.phone_digits for user in users.values() if user.profile.phone_digits],
+        }
+
+    return get_shared_search(SEARCH_NAME, query_lower, compute)
+
+
+def shared_phone_matches(phone_lookup):
+    """
+    The user-independent part of a phone search for the lookups built by
+    SearchView._phone_lookup: registered users with a matching number
+    ordered by id or, when there are none, contacts of every user with a
+    matching number, one per name ordered by lowercase name. Email
+    visibility of contacts depends on the searcher and is applied later.
+    Returns {'kind': 'users' or 'contacts', 'complete': bool, 'items': [...]};
+    when complete is False items holds only the first
+    SEARCH_CACHE_MAX_RESULTS + 1 matches.
+    """
+    def compute():
+        limit = settings.SEARCH_CACHE_MAX_RESULTS
+        users = list(User.objects.select_related('profile').filter(
+            **{f'profile__{lookup}': value for lookup, value in phone_lookup.items()}
+        ).order_by('id')[:limit + 1])
+        if users:
+            return {
+                'kind': 'users',
+                'complete': len(users) <= limit,
+                'items': [user_search_result(user) for user in users],
+            }
+
+        names = phone_contact_matches(phone_lookup, limit + 1)
+        items = [
+            {
+                'name_key': name_key,
+                'id': contact.id,
+                'name': contact.name,
+                'phone_number': str(contact.phone_number),
+                'owner_id': contact.owner_id,
+                'owner_email': contact.owner.email,
+            }
+            for name_key, contact in names
+        ]
+        return {'kind': 'contacts', 'complete': len(names) <= limit, 'items': items}
+
+    return get_shared_search(SEARCH_PHONE, phone_lookup, compute, phone_search_scope(phone_lookup))
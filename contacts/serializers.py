@@ -1,8 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Contact, SpamReport
+from .models import Contact, SpamReport, ImportJob
 from django.contrib.auth import get_user_model
-from phonenumber_field.phonenumber import PhoneNumber
 from phonenumber_field.serializerfields import PhoneNumberField
+from .spam import get_spam_likelihoods
+from .utils import normalize_phone_number
 
 User = get_user_model()
 
@@ -66,18 +68,25 @@ class SearchResultSerializer(serializers.Serializer):
         if not request or not request.user.is_authenticated:
             return None
 
-        # For registered users, show email only if the requesting user is in their contacts
-        if obj['is_registered']:
-            return obj['email'] if Contact.objects.filter(
-                owner=request.user,
-                phone_number=obj['phone_number']
-            ).exists() else None
+        # Email is only shown if the requesting user has the number in their contacts,
+        # both for registered users and for contact entries
+        phone_number = normalize_phone_number(obj['phone_number'])
+        return obj['email'] if phone_number in self._get_contact_numbers(request.user) else None
 
-        # For contacts, show email only if the requesting user owns the contact
-        return obj['email'] if Contact.objects.filter(
-            owner=request.user,
-            phone_number=obj['phone_number']
-        ).exists() else None
+    def _get_contact_numbers(self, user):
+        """
+        Phone numbers in the requesting user's contacts, taken from the
+        serializer context or fetched once per serializer.
+        """
+        contact_numbers = self.context.get('contact_numbers')
+        if contact_numbers is None:
+            contact_numbers = getattr(self, '_contact_numbers', None)
+        if contact_numbers is None:
+            contact_numbers = self._contact_numbers = {
+                normalize_phone_number(number)
+                for number in Contact.objects.for_owner(user).values_list('phone_number', flat=True)
+            }
+        return contact_numbers
 
     def get_phone_number(self, obj):
         # Handle both model instances and dictionary items
@@ -89,18 +98,31 @@ class SearchResultSerializer(serializers.Serializer):
 
     def get_spam_likelihood(self, obj):
         phone_number = self.get_phone_number(obj)
-        try:
-            phone_obj = PhoneNumber.from_string(phone_number)
-            
-            # Count spam reports
-            spam_count = SpamReport.objects.filter(phone_number=phone_obj).count()
-            # Count contacts (non-spam)
-            contact_count = Contact.objects.filter(phone_number=phone_obj).count()
-            
-            total_references = spam_count + contact_count
-            if total_references == 0:
-                return 0
-                
-            return round((spam_count / total_references) * 100, 2)
-        except:
-            return 0 
\ No newline at end of file
+        # Prefer statistics already resolved for the whole result set
+        likelihoods = self.context.get('spam_likelihoods')
+        if likelihoods is None:
+            likelihoods = get_spam_likelihoods([phone_number])
+        return likelihoods.get(normalize_phone_number(phone_number), 0.0)
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for ImportJob progress.
+    """
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'status', 'total', 'processed', 'imported', 'failed', 'failures',
+                  'error', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+class SpamCheckBatchSerializer(serializers.Serializer):
+    """
+    Request body for checking many phone numbers at once.
+    """
+    phone_numbers = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+
+    def validate_phone_numbers(self, value):
+        if len(value) > settings.SPAM_CHECK_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'At most {settings.SPAM_CHECK_BATCH_MAX_SIZE} phone numbers can be checked per request.'
+            )
+        return value
@@ -0,0 +1,246 @@
+"""
+Optional sharding of contacts by owner.
+
+With CONTACT_SHARDS set to a list of database aliases, each user's
+contacts live on CONTACT_SHARDS[owner_id % len(CONTACT_SHARDS)]. Queries
+for one owner (Contact.objects.for_owner(...), user.contacts, saves and
+deletes) are sent to that shard; lookups across every owner (contact
+counts per phone number, phone search) run on all shards in parallel
+through scatter_gather and merge the results. Any other contact query
+raises UnroutedContactQuery rather than silently reading the default
+database. Everything else, users included, stays on the default
+database, so contact ids are handed out by a sequence there to keep them
+unique across shards.
+
+Adding a shard changes where owners map to; existing contacts have to be
+moved by hand. Users live only on the default database, so the contact
+tables on the shards are created without the owner foreign key; on the
+default database it is kept.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+CONTACT_ID_SEQUENCE = 'contacts.Contact'
+
+
+class UnroutedContactQuery(RuntimeError):
+    """A contact query that does not say which shard it is for"""
+
+
+def is_sharded():
+    return bool(settings.CONTACT_SHARDS)
+
+
+def contact_db_for_owner(owner_id):
+    """Alias of the database holding owner_id's contacts"""
+    shards = settings.CONTACT_SHARDS
+    if not shards:
+        return DEFAULT_DB_ALIAS
+    return shards[owner_id % len(shards)]
+
+
+def contact_databases():
+    """
+    Aliases to query for contacts of every owner: the shards, or [None]
+    without sharding so queries keep their normal routing.
+    """
+    return list(settings.CONTACT_SHARDS) or [None]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONTACT_SHARD_WORKERS or len(settings.CONTACT_SHARDS),
+                thread_name_prefix='contact-shard'
+            )
+        return _executor
+
+
+def _run_on_shard(fn, alias):
+    # Worker threads have their own connections; treat each call like a
+    # request and drop connections that are broken or past CONN_MAX_AGE
+    connection = connections[alias]
+    connection.close_if_unusable_or_obsolete()
+    try:
+        return fn(alias)
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+
+def scatter_gather(fn):
+    """
+    Call fn(alias) for every alias of contact_databases() and return the
+    results in the same order. Shards are queried in parallel on a thread
+    pool, except a shard the caller has a transaction open on: that one
+    runs in the calling thread so it sees the transaction's writes.
+    """
+    aliases = contact_databases()
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+
+    futures = {
+        alias: _get_executor().submit(_run_on_shard, fn, alias)
+        for alias in aliases if not connections[alias].in_atomic_block
+    }
+    return [fn(alias) if alias not in futures else futures[alias].result() for alias in aliases]
+
+
+def count_contacts_by_phone_number(numbers):
+    """Number of contact entries per E.164 string for numbers, summed over every shard"""
+    from .models import Contact, count_by_phone_number
+
+    totals = Counter()
+    for counts in scatter_gather(
+        lambda alias: count_by_phone_number(Contact.objects.db_manager(alias).filter(phone_number__in=numbers))
+    ):
+        totals.update(counts)
+    return dict(totals)
+
+
+async def acount_contacts_by_phone_number(numbers):
+    """Async count_contacts_by_phone_number"""
+    from .models import Contact, acount_by_phone_number
+
+    if not is_sharded():
+        return await acount_by_phone_number(Contact.objects.filter(phone_number__in=numbers))
+    # The shards are already queried in parallel on the thread pool
+    return await sync_to_async(count_contacts_by_phone_number, thread_sensitive=False)(numbers)
+
+
+_id_block = range(0)
+_id_block_lock = threading.Lock()
+
+
+def assign_contact_ids(contacts):
+    """
+    Give unsaved contacts ids from the shared sequence, so ids stay unique
+    across shards. Does nothing without sharding.
+
+    Reserving ids locks the sequence row on the default database until
+    the surrounding transaction commits. Outside a transaction, single
+    creates take their ids from a block of CONTACT_ID_BLOCK_SIZE ids the
+    process reserves at a time, so they do not all queue on that row.
+    Inside one, a reservation could be rolled back after the ids were
+    handed out, so the ids are reserved with the transaction instead.
+    """
+    global _id_block
+    from django.db.models import Max
+    from .models import Contact, IdSequence
+
+    contacts = [contact for contact in contacts if contact.pk is None]
+    if not contacts or not is_sharded():
+        return
+
+    def highest_id():
+        # Start above contacts created before the sequence existed
+        return max(
+            Contact.objects.db_manager(alias).aggregate(highest=Max('id'))['highest'] or 0
+            for alias in contact_databases()
+        )
+
+    block_size = settings.CONTACT_ID_BLOCK_SIZE
+    if len(contacts) >= block_size or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        ids = IdSequence.allocate(CONTACT_ID_SEQUENCE, len(contacts), start_after=highest_id)
+    else:
+        with _id_block_lock:
+            if len(_id_block) < len(contacts):
+                _id_block = IdSequence.allocate(CONTACT_ID_SEQUENCE, block_size, start_after=highest_id)
+            ids, _id_block = _id_block[:len(contacts)], _id_block[len(contacts):]
+    for contact, pk in zip(contacts, ids):
+        contact.pk = pk
+
+
+def reset_contact_ids():
+    """Drop this process's reserved block of contact ids"""
+    global _id_block
+    with _id_block_lock:
+        _id_block = range(0)
+
+
+class ContactShardRouter:
+    """
+    Send contact reads and writes for a known owner to the owner's shard.
+    The owner is known from a Contact instance or, for related managers
+    such as user.contacts, from the user; other contact queries without a
+    database raise UnroutedContactQuery. Only contacts are created on the
+    shards.
+    """
+    def _db_for_contact(self, model, **hints):
+        if model._meta.label != 'contacts.Contact' or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, model):
+            # Keep rows where they were read from
+            if instance._state.db in settings.CONTACT_SHARDS:
+                return instance._state.db
+            return contact_db_for_owner(instance.owner_id)
+        if instance is not None and instance._meta.label == settings.AUTH_USER_MODEL:
+            return contact_db_for_owner(instance.pk)
+        raise UnroutedContactQuery(
+            'Contacts are sharded: use Contact.objects.for_owner(), using() or scatter_gather()'
+        )
+
+    db_for_read = _db_for_contact
+    db_for_write = _db_for_contact
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Contacts refer to owners on the default database
+        if is_sharded() and 'contacts.Contact' in (obj1._meta.label, obj2._meta.label):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.CONTACT_SHARDS and db != DEFAULT_DB_ALIAS:
+            return app_label == 'contacts' and model_name == 'contact'
+        return None
+
+
+class ShardSchemaEditorMixin:
+    """
+    Schema editor that creates no foreign keys outside the default
+    database. Only the default database holds users, so on a contact shard
+    the owner key would refer to a table that is missing (PostgreSQL then
+    refuses to create it) or never written to.
+    """
+    def __enter__(self):
+        self._skip_foreign_keys = self.connection.alias != DEFAULT_DB_ALIAS
+        if self._skip_foreign_keys:
+            # Inline keys (SQLite) are written from these templates, the
+            # others are only added when the database supports them
+            self.sql_create_inline_fk = self.sql_create_column_inline_fk = None
+            self.connection.features.supports_foreign_keys = False
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            if self._skip_foreign_keys:
+                del self.connection.features.supports_foreign_keys
+
+
+_schema_editor_classes = {}
+
+
+@receiver(connection_created)
+def use_shard_schema_editor(sender, connection, **kwargs):
+    """Give every connection a ShardSchemaEditorMixin schema editor"""
+    editor_class = connection.SchemaEditorClass
+    if not issubclass(editor_class, ShardSchemaEditorMixin):
+        if editor_class not in _schema_editor_classes:
+            _schema_editor_classes[editor_class] = type(
+                editor_class.__name__, (ShardSchemaEditorMixin, editor_class), {}
+            )
+        connection.SchemaEditorClass = _schema_editor_classes[editor_class]
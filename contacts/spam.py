@@ -0,0 +1,177 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.http import quote_etag
+from .models import (
+    SpamReport, PhoneNumberStats, count_by_phone_number, acount_by_phone_number, build_spam_stats
+)
+from caller_id.stampede import get_or_compute_many, aget_or_compute_many
+from .bloom import get_spam_filter
+from .sharding import count_contacts_by_phone_number, acount_contacts_by_phone_number
+from .scoring import get_scorer
+from .utils import normalize_phone_number, spam_cache_key
+
+
+def read_spam_stats(numbers):
+    """Statistics entries for the numbers that have a stats row, keyed by E.164 string"""
+    return {
+        normalize_phone_number(row.phone_number): row.to_stats()
+        for row in PhoneNumberStats.objects.filter(phone_number__in=numbers)
+    }
+
+
+def load_spam_stats(numbers):
+    """
+    Resolve spam statistics for normalized phone numbers from the database.
+    Reads the stats table in one query; numbers without a stats row are
+    counted with one grouped aggregate per source table and backfilled.
+    """
+    stats = read_spam_stats(numbers)
+
+    missing = set(numbers) - stats.keys()
+    if missing:
+        # Numbers the reported-numbers filter rules out have no reports to count
+        spam_filter = get_spam_filter()
+        reported = missing if spam_filter is None else {n for n in missing if n in spam_filter}
+        spam_counts = {}
+        if reported:
+            spam_counts = count_by_phone_number(SpamReport.objects.filter(phone_number__in=reported))
+        contact_counts = count_contacts_by_phone_number(missing)
+        for number in missing:
+            stats[number] = build_spam_stats(
+                spam_counts.get(number, 0), contact_counts.get(number, 0)
+            )
+
+        # Numbers with references but no stats row were written without
+        # signals (e.g. raw SQL); repair their rows for the next lookup
+        stale = set(spam_counts) | set(contact_counts)
+        if stale:
+            PhoneNumberStats.refresh(stale, rescore=True)
+            stats.update(read_spam_stats(stale))
+
+    return stats
+
+
+async def aread_spam_stats(numbers):
+    """Async read_spam_stats"""
+    return {
+        normalize_phone_number(row.phone_number): row.to_stats()
+        async for row in PhoneNumberStats.objects.filter(phone_number__in=numbers)
+    }
+
+
+async def aload_spam_stats(numbers):
+    """Async load_spam_stats"""
+    stats = await aread_spam_stats(numbers)
+
+    missing = set(numbers) - stats.keys()
+    if missing:
+        spam_filter = await sync_to_async(get_spam_filter)()
+        reported = missing if spam_filter is None else {n for n in missing if n in spam_filter}
+        # An empty "in" lookup returns no rows without running a query
+        spam_counts = await acount_by_phone_number(SpamReport.objects.filter(phone_number__in=reported))
+        contact_counts = await acount_contacts_by_phone_number(missing)
+        for number in missing:
+            stats[number] = build_spam_stats(
+                spam_counts.get(number, 0), contact_counts.get(number, 0)
+            )
+
+        stale = set(spam_counts) | set(contact_counts)
+        if stale:
+            await sync_to_async(PhoneNumberStats.refresh)(stale, rescore=True)
+            stats.update(await aread_spam_stats(stale))
+
+    return stats
+
+
+def _current_stats(stats):
+    # Scores decay over time, so the likelihood is worked out as of now
+    scorer = get_scorer()
+    now = timezone.now()
+    return {
+        number: dict(entry, spam_likelihood=scorer.current_likelihood(
+            entry['spam_score'], entry['scored_at'], entry['contact_entries'], now
+        ))
+        for number, entry in stats.items()
+    }
+
+
+def get_spam_stats(phone_numbers):
+    """
+    Look up spam statistics for many phone numbers at once.
+    Does one cache.get_many for the whole set and resolves the misses with
+    batched queries, with single-flight protection so concurrent requests
+    for the same expired entry recompute it once. Entries are dropped by
+    PhoneNumberStats.refresh whenever a number's contacts or reports
+    change, so they can be cached for a long time.
+    Returns a dict keyed by E.164 string.
+    """
+    numbers = {normalize_phone_number(number) for number in phone_numbers}
+    numbers.discard(None)
+    if not numbers:
+        return {}
+
+    keys = {spam_cache_key(number): number for number in numbers}
+    return _current_stats(get_or_compute_many(keys, load_spam_stats, settings.SPAM_STATS_CACHE_TIMEOUT))
+
+
+async def aget_spam_stats(phone_numbers):
+    """Async get_spam_stats"""
+    numbers = {normalize_phone_number(number) for number in phone_numbers}
+    numbers.discard(None)
+    if not numbers:
+        return {}
+
+    keys = {spam_cache_key(number): number for number in numbers}
+    return _current_stats(await aget_or_compute_many(keys, aload_spam_stats, settings.SPAM_STATS_CACHE_TIMEOUT))
+
+
+def get_spam_likelihoods(phone_numbers):
+    """
+    Return a dict mapping E.164 strings to spam likelihood percentages.
+    Numbers the reported-numbers filter rules out have never been reported,
+    so they are answered with 0% without touching the cache or database.
+    """
+    numbers = {normalize_phone_number(number) for number in phone_numbers}
+    numbers.discard(None)
+
+    likelihoods = {}
+    spam_filter = get_spam_filter()
+    if spam_filter is not None:
+        likelihoods = {number: 0.0 for number in numbers if number not in spam_filter}
+        numbers -= likelihoods.keys()
+
+    likelihoods.update(
+        (number, entry['spam_likelihood'])
+        for number, entry in get_spam_stats(numbers).items()
+    )
+    return likelihoods
+
+
+async def aget_spam_likelihoods(phone_numbers):
+    """Async get_spam_likelihoods"""
+    numbers = {normalize_phone_number(number) for number in phone_numbers}
+    numbers.discard(None)
+
+    likelihoods = {}
+    spam_filter = await sync_to_async(get_spam_filter)()
+    if spam_filter is not None:
+        likelihoods = {number: 0.0 for number in numbers if number not in spam_filter}
+        numbers -= likelihoods.keys()
+
+    likelihoods.update(
+        (number, entry['spam_likelihood'])
+        for number, entry in (await aget_spam_stats(numbers)).items()
+    )
+    return likelihoods
+
+
+def spam_stats_etag(number, entry):
+    """
+    Entity tag for a number's statistics entry.
+    The stats version changes on every recompute, so the tag can be
+    derived from the cached entry without reading the database. The
+    likelihood is included because a decaying score changes it between
+    recomputes.
+    """
+    return quote_etag(f"{number}-{entry['version']}-{entry['spam_likelihood']}")
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import Contact, ContactTombstone
+from .pagination import encode_position, decode_position
+
+
+def _after(queryset, field, position):
+    """Filter a queryset to rows strictly after a (timestamp, id) keyset position"""
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk})
+    )
+
+
+def _dump_position(position):
+    if position is None:
+        return None
+    timestamp, pk = position
+    return [timestamp.isoformat(), pk]
+
+
+def _load_position(value):
+    if value is None:
+        return None
+    timestamp, pk = value
+    return datetime.fromisoformat(timestamp), int(pk)
+
+
+class SyncTokenExpired(ValueError):
+    """The watermark is older than the tombstone retention period"""
+
+
+def _settled(position, cutoff):
+    """
+    Hold a position back to cutoff. Rows are stamped when they are written
+    but become visible when their transaction commits, so a row committed
+    late can carry a timestamp older than rows already returned; rows
+    newer than the cutoff are returned again on the next call instead.
+    """
+    if position is None or position[0] <= cutoff:
+        return position
+    return cutoff, 0
+
+
+def encode_sync_token(contacts_position, deleted_position, issued_at=None):
+    """Opaque watermark covering both contact updates and deletions"""
+    return encode_position({
+        'contacts': _dump_position(contacts_position),
+        'deleted': _dump_position(deleted_position),
+        'issued': (issued_at or timezone.now()).isoformat(),
+    })
+
+
+def decode_sync_token(token):
+    """
+    Decode a watermark from encode_sync_token, raising ValueError if it is
+    malformed and SyncTokenExpired if deletions it depends on may have been
+    pruned (see prune_tombstones).
+    """
+    position = decode_position(token)
+    try:
+        contacts_position, deleted_position = _load_position(position['contacts']), _load_position(position['deleted'])
+        issued_at = datetime.fromisoformat(position['issued'])
+    except KeyError:
+        # Tokens from before tombstones were pruned
+        raise SyncTokenExpired('Sync token expired')
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Malformed token: {e}')
+    if issued_at < timezone.now() - timedelta(seconds=settings.CONTACT_TOMBSTONE_RETENTION):
+        raise SyncTokenExpired('Sync token expired')
+    return contacts_position, deleted_position
+
+
+def prune_tombstones(batch_size=1000):
+    """
+    Delete tombstones older than CONTACT_TOMBSTONE_RETENTION seconds.
+    Watermarks issued before that are rejected as expired, so clients
+    holding them sync everything again instead of missing deletions.
+    Returns the number of tombstones deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CONTACT_TOMBSTONE_RETENTION)
+    total = 0
+    while True:
+        ids = list(ContactTombstone.objects.filter(deleted_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += ContactTombstone.objects.filter(pk__in=ids).delete()[0]
+
+
+def get_contact_changes(owner, token, limit):
+    """
+    Contacts created or updated, and ids of contacts deleted, since a watermark.
+    Both streams are read in (timestamp, id) order using the (owner, updated_at)
+    and (owner, deleted_at) indexes and capped at limit rows each.
+    Without a token every contact is returned and only deletions from now
+    on are tracked. Once a stream is exhausted its watermark is held
+    CONTACT_SYNC_SAFETY_LAG seconds in the past, so rows committed late by
+    long transactions are not skipped; clients may see a row twice.
+    Returns (contacts, deleted_ids, next_token, has_more).
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.CONTACT_SYNC_SAFETY_LAG)
+    if token:
+        contacts_position, deleted_position = decode_sync_token(token)
+    else:
+        contacts_position = None
+        latest = ContactTombstone.objects.filter(owner=owner).order_by(
+            '-deleted_at', '-pk'
+        ).values_list('deleted_at', 'pk').first()
+        deleted_position = tuple(latest) if latest else None
+
+    contacts = list(_after(
+        Contact.objects.for_owner(owner), 'updated_at', contacts_position
+    ).order_by('updated_at', 'pk')[:limit + 1])
+    tombstones = list(_after(
+        ContactTombstone.objects.filter(owner=owner), 'deleted_at', deleted_position
+    ).order_by('deleted_at', 'pk').values_list('deleted_at', 'pk', 'contact_id')[:limit + 1])
+
+    more_contacts = len(contacts) > limit
+    more_tombstones = len(tombstones) > limit
+    contacts = contacts[:limit]
+    tombstones = tombstones[:limit]
+
+    if contacts:
+        contacts_position = (contacts[-1].updated_at, contacts[-1].pk)
+    if tombstones:
+        deleted_position = tombstones[-1][:2]
+    # Pages in between follow the last row, or paging would never end
+    if not more_contacts:
+        contacts_position = _settled(contacts_position, cutoff)
+    if not more_tombstones:
+        deleted_position = _settled(deleted_position, cutoff)
+
+    deleted_ids = [contact_id for deleted_at, pk, contact_id in tombstones]
+    next_token = encode_sync_token(contacts_position, deleted_position, now)
+    return contacts, deleted_ids, next_token, more_contacts or more_tombstones
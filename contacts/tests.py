@@ -1,12 +1,33 @@
-from django.test import TestCase, override_settings
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from .models import Contact, SpamReport
+from .models import Contact, ContactTombstone, SpamReport, PhoneNumberStats, NameIndexEntry, ImportJob
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from users.models import UserProfile
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from .spam import get_spam_stats, get_spam_likelihoods
+from .bloom import BloomFilter, get_spam_filter, reset_spam_filter
+from .importer import import_contacts
+from .management.commands.explain_queries import sorts, weak_searches
+from .search import search_name_index, search_contacts_by_name
+from .sharding import UnroutedContactQuery, contact_db_for_owner, reset_contact_ids
+from .views import ContactListView, SearchThrottle
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from phonenumber_field.phonenumber import PhoneNumber
 import json
+import gzip
+from datetime import timedelta
+from django.utils import timezone
+import os
+import shutil
+import tempfile
 import csv
 from io import StringIO
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -39,6 +60,7 @@ class PhoneNumberValidationTest(APITestCase):
 class SpamTest(APITestCase):
     def setUp(self):
         """Create a user and authenticate"""
+        cache.clear()
         self.user = User.objects.create_user(
             username='testuser',
             password='testpass123',
@@ -64,6 +86,47 @@ class SpamTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['spam_likelihood'], 50.0)
 
+    def test_check_spam_conditional(self):
+        """Test that re-checking an unchanged number returns 304 without queries"""
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551234')
+
+        response = self.client.get('/api/spam/check/+12125551234/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/spam/check/+12125551234/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = User.objects.create_user(username='otheruser', password='testpass123')
+        UserProfile.objects.filter(user=other).update(phone_number='+12125550002')
+        with self.captureOnCommitCallbacks(execute=True):
+            SpamReport.objects.create(reporter=other, phone_number='+12125551234')
+
+        response = self.client.get('/api/spam/check/+12125551234/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['spam_reports'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_check(self):
+        """Test checking many numbers in one request"""
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551234')
+        Contact.objects.create(owner=self.user, name='John Doe', phone_number='+12125551234')
+        single = self.client.get('/api/spam/check/+12125551234/').data
+
+        numbers = ['+12125551234', '+1 212-555-9999', 'not-a-number']
+        response = self.client.post('/api/spam/check/batch/', {'phone_numbers': numbers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results']['+12125551234'], single)
+        self.assertEqual(response.data['results']['+1 212-555-9999']['spam_likelihood'], 0.0)
+        self.assertEqual(response.data['invalid'], ['not-a-number'])
+
+        with override_settings(SPAM_CHECK_BATCH_MAX_SIZE=2):
+            response = self.client.post('/api/spam/check/batch/', {'phone_numbers': numbers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 @override_settings(DEBUG=True, REST_FRAMEWORK={
     'DEFAULT_THROTTLE_CLASSES': [],
     'DEFAULT_THROTTLE_RATES': {}
@@ -142,3 +205,1057 @@ class BulkOperationsTest(APITestCase):
             
             # If we get here, none of the URLs worked
             self.fail("None of the export URLs worked")
+
+class PhoneNumberStatsTest(TestCase):
+    """
+    Test cases for the denormalized per-number spam statistics.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.other = User.objects.create_user(username='otheruser', password='testpass123')
+        UserProfile.objects.filter(user=self.other).update(phone_number='+12125550002')
+
+    def test_stats_follow_contact_and_report_changes(self):
+        """Test that signal handlers keep stats in sync with the source tables"""
+        contact = Contact.objects.create(owner=self.user, name='John Doe', phone_number='+12125551234')
+        SpamReport.objects.create(reporter=self.other, phone_number='+12125551234')
+
+        stats = PhoneNumberStats.objects.get(phone_number='+12125551234')
+        self.assertEqual((stats.spam_count, stats.contact_count, stats.likelihood), (1, 1, 50.0))
+
+        contact.phone_number = '+12125559999'
+        contact.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.spam_count, stats.contact_count, stats.likelihood), (1, 0, 100.0))
+        self.assertEqual(PhoneNumberStats.objects.get(phone_number='+12125559999').contact_count, 1)
+
+        version = PhoneNumberStats.objects.get(phone_number='+12125559999').version
+        contact.delete()
+        stats = PhoneNumberStats.objects.get(phone_number='+12125559999')
+        self.assertEqual((stats.contact_count, stats.likelihood), (0, 0.0))
+        self.assertGreater(stats.version, version)
+
+    def test_version_bumped_in_database(self):
+        """Test that a version bumped by a concurrent writer is not handed out again"""
+        Contact.objects.create(owner=self.user, name='John Doe', phone_number='+12125551234')
+        version = PhoneNumberStats.objects.get(phone_number='+12125551234').version
+        counts = {'+12125551234': 1}
+
+        def concurrent_refresh(numbers):
+            PhoneNumberStats.objects.filter(phone_number='+12125551234').update(version=F('version') + 1)
+            return counts
+
+        with mock.patch('contacts.models.count_contacts_by_phone_number', side_effect=concurrent_refresh):
+            PhoneNumberStats.refresh(['+12125551234'])
+        self.assertEqual(PhoneNumberStats.objects.get(phone_number='+12125551234').version, version + 2)
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command restores stats from scratch"""
+        Contact.objects.create(owner=self.user, name='John Doe', phone_number='+12125551234')
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551234')
+        SpamReport.objects.create(reporter=self.other, phone_number='+12125551234')
+        PhoneNumberStats.objects.all().delete()
+
+        call_command('rebuild_phone_stats', stdout=StringIO())
+
+        stats = PhoneNumberStats.objects.get(phone_number='+12125551234')
+        self.assertEqual((stats.spam_count, stats.contact_count, stats.likelihood), (2, 1, 66.67))
+
+    def test_rebuild_keeps_concurrent_refresh(self):
+        """Test that a rebuild does not overwrite a refresh made after it started"""
+        Contact.objects.create(owner=self.user, name='John Doe', phone_number='+12125551234')
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551234')
+        stream_stats = PhoneNumberStats._stream_stats
+
+        def stream_then_report(now):
+            stats = list(stream_stats(now))
+            SpamReport.objects.create(reporter=self.other, phone_number='+12125551234')
+            return stats
+
+        with mock.patch.object(PhoneNumberStats, '_stream_stats', side_effect=stream_then_report):
+            call_command('rebuild_phone_stats', stdout=StringIO())
+
+        stats = PhoneNumberStats.objects.get(phone_number='+12125551234')
+        self.assertEqual((stats.spam_count, stats.contact_count), (2, 1))
+
+    def test_rebuild_in_batches(self):
+        """Test that a batched rebuild repairs drifted rows and can warm the cache"""
+        cache.clear()
+        for i in range(5):
+            Contact.objects.create(owner=self.user, name=f'Contact {i}', phone_number=f'+1212555100{i}')
+        SpamReport.objects.create(reporter=self.other, phone_number='+12125551000')
+        PhoneNumberStats.objects.filter(phone_number='+12125551001').delete()
+        PhoneNumberStats.objects.filter(phone_number='+12125551002').update(contact_count=7)
+        bogus = PhoneNumberStats.objects.create(phone_number='+12125559999', spam_count=3, version=4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_phone_stats', batch_size=2, warm_cache=True, stdout=StringIO())
+
+        counts = dict(
+            (str(number), (spam_count, contact_count)) for number, spam_count, contact_count in
+            PhoneNumberStats.objects.values_list('phone_number', 'spam_count', 'contact_count')
+        )
+        self.assertEqual(counts['+1 212-555-1000'], (1, 1))
+        self.assertEqual(counts['+1 212-555-1001'], (0, 1))
+        self.assertEqual(counts['+1 212-555-1002'], (0, 1))
+        bogus.refresh_from_db()
+        self.assertEqual((bogus.spam_count, bogus.version), (0, 5))
+
+        with self.assertNumQueries(0):
+            stats = get_spam_stats([f'+1212555100{i}' for i in range(5)])
+        self.assertEqual(stats['+12125551000']['spam_likelihood'], 50.0)
+
+class SpamStatsBatchTest(TestCase):
+    """
+    Test cases for batched spam statistics resolution.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        for i in range(5):
+            Contact.objects.create(owner=self.user, name=f'Contact {i}', phone_number=f'+1212555100{i}')
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551000')
+
+    def test_batch_lookup_uses_cache(self):
+        """Test that a result set is resolved in one round and then served from cache"""
+        numbers = [f'+1212555100{i}' for i in range(5)] + ['+12125559999']
+
+        # One stats query plus one grouped count per table for the unknown number
+        with self.assertNumQueries(3):
+            stats = get_spam_stats(numbers)
+        self.assertEqual(stats['+12125551000']['spam_likelihood'], 50.0)
+        self.assertEqual(stats['+12125551001']['spam_likelihood'], 0.0)
+        self.assertEqual(stats['+12125559999']['spam_reports'], 0)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_spam_stats(numbers), stats)
+
+    def test_cache_follows_writes(self):
+        """Test that new reports and deleted contacts drop the cached entry"""
+        self.assertEqual(get_spam_stats(['+1 212-555-1000'])['+12125551000']['spam_likelihood'], 50.0)
+
+        other = User.objects.create_user(username='otheruser', password='testpass123')
+        UserProfile.objects.filter(user=other).update(phone_number='+12125550002')
+        with self.captureOnCommitCallbacks(execute=True):
+            SpamReport.objects.create(reporter=other, phone_number='+12125551000')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_spam_stats(['+12125551000'])['+12125551000']['spam_likelihood'], 66.67)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.filter(phone_number='+12125551000').delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_spam_stats(['+12125551000'])['+12125551000']['spam_likelihood'], 100.0)
+        with self.assertNumQueries(0):
+            get_spam_stats(['+12125551000'])
+
+    def test_older_refresh_does_not_overwrite_cache(self):
+        """Test that a refresh committing after a newer one does not cache its older counts"""
+        other = User.objects.create_user(username='otheruser', password='testpass123')
+        UserProfile.objects.filter(user=other).update(phone_number='+12125550002')
+        with self.captureOnCommitCallbacks() as older:
+            PhoneNumberStats.refresh(['+12125551000'])
+        with self.captureOnCommitCallbacks(execute=True):
+            SpamReport.objects.create(reporter=other, phone_number='+12125551000')
+        self.assertEqual(get_spam_stats(['+12125551000'])['+12125551000']['spam_reports'], 2)
+
+        for callback in older:
+            callback()
+        self.assertEqual(get_spam_stats(['+12125551000'])['+12125551000']['spam_reports'], 2)
+
+@override_settings(SPAM_SCORER='contacts.scoring.DecayedScorer', SPAM_SCORE_HALF_LIFE=60 * 60 * 24)
+class SpamScoringTest(TestCase):
+    """
+    Test cases for weighted, time-decayed spam scores.
+    """
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'user{i}', password='testpass123')
+            UserProfile.objects.filter(user=user).update(phone_number=f'+1212555000{i}')
+            self.users.append(user)
+        Contact.objects.create(owner=self.users[0], name='John Doe', phone_number='+12125551234')
+
+    def likelihood(self):
+        return get_spam_stats(['+12125551234'])['+12125551234']['spam_likelihood']
+
+    def age_stats(self, days):
+        """Pretend the number's reports and stored score are days older"""
+        PhoneNumberStats.objects.filter(phone_number='+12125551234').update(
+            scored_at=F('scored_at') - timedelta(days=days)
+        )
+        SpamReport.objects.filter(phone_number='+12125551234').update(
+            reported_at=F('reported_at') - timedelta(days=days)
+        )
+        cache.clear()
+
+    def test_reputation_and_decay(self):
+        """Test that reports are weighted by reputation and lose weight over time"""
+        self.users[1].profile.reputation = 2.0
+        self.users[1].profile.save()
+        report = SpamReport.objects.create(reporter=self.users[1], phone_number='+12125551234')
+        self.assertEqual(report.weight, 2.0)
+        self.assertEqual(self.likelihood(), 66.67)
+
+        # One half-life later the report weighs 1, as much as the contact
+        self.age_stats(1)
+        self.assertEqual(self.likelihood(), 50.0)
+
+        # New reports are added to the decayed score
+        with self.captureOnCommitCallbacks(execute=True):
+            SpamReport.objects.create(reporter=self.users[2], phone_number='+12125551234')
+        self.assertEqual(self.likelihood(), 66.67)
+
+        # Deleting a report removes its decayed weight
+        report.refresh_from_db()
+        report.delete()
+        stats = PhoneNumberStats.objects.get(phone_number='+12125551234')
+        self.assertAlmostEqual(stats.spam_score, 1.0, places=3)
+
+    def test_rebuild_matches_incremental_scores(self):
+        """Test that a full recompute agrees with the incrementally kept score"""
+        SpamReport.objects.create(reporter=self.users[1], phone_number='+12125551234')
+        self.age_stats(2)
+        SpamReport.objects.create(reporter=self.users[2], phone_number='+12125551234')
+        incremental = PhoneNumberStats.objects.get(phone_number='+12125551234').spam_score
+
+        PhoneNumberStats.rebuild()
+        rebuilt = PhoneNumberStats.objects.get(phone_number='+12125551234').spam_score
+        self.assertAlmostEqual(incremental, 1.25, places=3)
+        self.assertAlmostEqual(rebuilt, incremental, places=3)
+
+    @override_settings(SPAM_SCORER='contacts.scoring.RatioScorer')
+    def test_ratio_scorer(self):
+        """Test that the ratio scorer ignores reputation and age"""
+        self.users[1].profile.reputation = 2.0
+        self.users[1].profile.save()
+        SpamReport.objects.create(reporter=self.users[1], phone_number='+12125551234')
+        self.age_stats(30)
+        self.assertEqual(self.likelihood(), 50.0)
+
+@override_settings(SPAM_FILTER_ENABLED=True, SPAM_FILTER_PATH=None)
+class SpamFilterTest(TestCase):
+    """
+    Test cases for the reported-numbers Bloom filter.
+    """
+    def setUp(self):
+        cache.clear()
+        reset_spam_filter()
+        self.addCleanup(reset_spam_filter)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125551000')
+
+    def test_unreported_numbers_skip_lookups(self):
+        """Test that numbers ruled out by the filter need no cache or database lookup"""
+        get_spam_filter()
+        with self.assertNumQueries(0):
+            likelihoods = get_spam_likelihoods([f'+1212555200{i}' for i in range(5)])
+        self.assertEqual(set(likelihoods.values()), {0.0})
+        self.assertEqual(get_spam_likelihoods(['+12125551000'])['+12125551000'], 100.0)
+
+        # New reports are added to the loaded filter
+        SpamReport.objects.create(reporter=self.user, phone_number='+12125552000')
+        self.assertIn('+12125552000', get_spam_filter())
+        self.assertEqual(get_spam_likelihoods(['+12125552000'])['+12125552000'], 100.0)
+
+    def test_shared_filter_file(self):
+        """Test that the command writes a filter file that processes share through mmap"""
+        path = os.path.join(tempfile.mkdtemp(), 'reported.bloom')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('build_spam_filter', path=path, capacity=100, stdout=StringIO())
+
+        first = BloomFilter.open(path)
+        second = BloomFilter.open(path)
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        self.assertIn('+12125551000', first)
+        self.assertNotIn('+12125559999', first)
+
+        first.add('+12125559999')
+        self.assertIn('+12125559999', second)
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class SearchQueryCountTest(APITestCase):
+    """
+    Test that search runs a fixed number of queries regardless of result size.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            first_name='Anish',
+            email='anish@example.com'
+        )
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _search_query_count(self, query):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/search/', {'q': query, 'type': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response.data['results']
+
+    def test_name_search_query_count_is_constant(self):
+        """Test that adding more matching rows does not add queries"""
+        Contact.objects.create(owner=self.user, name='Anita 0', phone_number='+12125552000')
+        small_count, small_data = self._search_query_count('An')
+
+        for i in range(1, 10):
+            Contact.objects.create(owner=self.user, name=f'Anita {i}', phone_number=f'+1212555200{i}')
+        large_count, large_data = self._search_query_count('An')
+
+        self.assertEqual(len(large_data), len(small_data) + 9)
+        self.assertEqual(large_count, small_count)
+        # Contacts owned by the searching user expose the owner's email
+        self.assertEqual(large_data[-1]['email'], 'anish@example.com')
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class SearchCacheTest(APITestCase):
+    """
+    Test cases for the shared search result cache.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            username='alice', password='testpass123', first_name='Alice', email='alice@example.com'
+        )
+        self.alice.profile.phone_number = '+12125550001'
+        self.alice.profile.save()
+        self.bob = User.objects.create_user(
+            username='bob', password='testpass123', first_name='Bob', email='bob@example.com'
+        )
+        self.bob.profile.phone_number = '+12125550002'
+        self.bob.profile.save()
+        Contact.objects.create(owner=self.alice, name='Alicia Keys', phone_number='+14155550001')
+        self.client = APIClient()
+
+    def search(self, user, query, search_type):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/search/', {'q': query, 'type': search_type})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_name_search_overlays_own_contacts(self):
+        """Test that cached registered users are merged with each searcher's own contacts"""
+        self.assertEqual([r['name'] for r in self.search(self.alice, 'ali', 'name')], ['Alice', 'Alicia Keys'])
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.search(self.bob, 'ali', 'name')
+        self.assertEqual([r['name'] for r in results], ['Alice'])
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.first_name = 'Alina'
+            self.alice.save()
+        self.assertEqual([r['name'] for r in self.search(self.bob, 'ali', 'name')], ['Alina'])
+
+    def test_phone_search_emails_follow_searcher(self):
+        """Test that cached contact results only show emails to the contact's owner"""
+        self.assertEqual(self.search(self.bob, '+14155550001', 'phone')[0]['email'], None)
+        self.assertEqual(self.search(self.alice, '+14155550001', 'phone')[0]['email'], 'alice@example.com')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.create(owner=self.bob, name='Another Name', phone_number='+14155550001')
+        self.assertEqual(
+            [r['name'] for r in self.search(self.bob, '+14155550001', 'phone')], ['Alicia Keys', 'Another Name']
+        )
+
+    def test_contact_writes_drop_matching_phone_searches(self):
+        """Test that a contact write only drops cached phone searches matching its number"""
+        self.search(self.bob, '+14155550001', 'phone')
+        self.search(self.bob, '4155550001', 'phone')
+        self.search(self.bob, '+1415', 'phone')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.create(owner=self.bob, name='Other Number', phone_number='+13125559999')
+        with CaptureQueriesContext(connection) as queries:
+            self.search(self.bob, '+14155550001', 'phone')
+        # Only the searcher's own contacts are read, not the shared lookup
+        self.assertFalse(any('phone_digits' in query['sql'] for query in queries.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.create(owner=self.bob, name='Zed', phone_number='+14155550001')
+        for query in ['+14155550001', '4155550001', '+1415']:
+            self.assertIn('Zed', [r['name'] for r in self.search(self.bob, query, 'phone')])
+
+class AsyncViewTest(TestCase):
+    """
+    Test cases for the async search and spam check endpoints.
+    """
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            username='alice', password='testpass123', first_name='Alice', email='alice@example.com'
+        )
+        self.alice.profile.phone_number = '+12125550001'
+        self.alice.profile.save()
+        self.bob = User.objects.create_user(username='bob', password='testpass123', first_name='Bob')
+        self.bob.profile.phone_number = '+12125550002'
+        self.bob.profile.save()
+        Contact.objects.create(owner=self.alice, name='Alicia Keys', phone_number='+14155550001')
+        Contact.objects.create(owner=self.bob, name='Alice Work', phone_number='+12125550001')
+        SpamReport.objects.create(reporter=self.bob, phone_number='+14155550001')
+
+    def get(self, user, url, params=None, **headers):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get(url, params, HTTP_AUTHORIZATION=f'Bearer {token}', **headers)
+
+    def test_requires_token(self):
+        """Test that requests without a valid token are rejected"""
+        self.assertEqual(self.client.get('/api/async/search/', {'q': 'ali'}).status_code, 401)
+        response = self.client.get('/api/async/search/', {'q': 'ali'}, HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+
+    def test_search_matches_sync_view(self):
+        """Test that async search returns the same pages as SearchView"""
+        client = APIClient()
+        for user, params in [
+            (self.alice, {'q': 'ali', 'type': 'name'}),
+            (self.bob, {'q': 'ali', 'type': 'name'}),
+            (self.alice, {'q': 'ali', 'type': 'name', 'page_size': 1}),
+            (self.bob, {'q': '+14155550001'}),
+            (self.alice, {'q': '5550001', 'type': 'phone'}),
+        ]:
+            client.force_authenticate(user=user)
+            expected = client.get('/api/search/', params).json()
+            response = self.get(user, '/api/async/search/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], expected['results'])
+            self.assertEqual(response.json()['next'] is None, expected['next'] is None)
+
+        response = self.get(self.alice, '/api/async/search/', {'q': 'ali', 'cursor': 'bad'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_spam_check(self):
+        """Test async spam check results and conditional requests"""
+        response = self.get(self.alice, '/api/async/spam/check/+14155550001/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['spam_reports'], 1)
+        self.assertEqual(response.json()['contact_entries'], 1)
+        self.assertEqual(response.json()['spam_likelihood'], 50.0)
+
+        response = self.get(
+            self.alice, '/api/async/spam/check/+14155550001/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Numbers without a stats row are counted directly
+        PhoneNumberStats.objects.all().delete()
+        cache.clear()
+        response = self.get(self.alice, '/api/async/spam/check/+14155550001/')
+        self.assertEqual(response.json()['spam_reports'], 1)
+        self.assertEqual(self.get(self.alice, '/api/async/spam/check/12/').status_code, 400)
+
+    def test_spam_check_matches_sync_view(self):
+        """Test that async spam check answers valid and invalid numbers like SpamCheckView"""
+        client = APIClient()
+        client.force_authenticate(user=self.alice)
+        for number in ['+14155550001', '14155550001', '+12125559999', '12', '+1234', 'abc']:
+            expected = client.get(f'/api/spam/check/{number}/')
+            response = self.get(self.alice, f'/api/async/spam/check/{number}/')
+            self.assertEqual(response.status_code, expected.status_code, number)
+            self.assertEqual(response.json(), expected.json(), number)
+
+    def test_spam_check_throttled(self):
+        """Test that async spam check is rate limited like the sync view"""
+        with mock.patch.object(SearchThrottle, 'rate', '1/minute'):
+            self.assertEqual(self.get(self.alice, '/api/async/spam/check/+14155550001/').status_code, 200)
+            response = self.get(self.alice, '/api/async/spam/check/+14155550001/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class PhoneSearchTest(APITestCase):
+    """
+    Test cases for phone search over the indexed digits columns.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.user.profile.phone_number = '+12125550001'
+        self.user.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Contact.objects.create(owner=self.user, name='John Doe', phone_number='+14155551234')
+
+    def test_phone_digits_populated_on_save(self):
+        """Test that the digits columns are filled when saving"""
+        contact = Contact.objects.get(name='John Doe')
+        self.assertEqual(contact.phone_digits, '14155551234')
+        self.assertEqual(contact.phone_digits_reversed, '43215555141')
+        self.assertEqual(UserProfile.objects.get(user=self.user).phone_digits, '12125550001')
+
+    def test_exact_and_suffix_search(self):
+        """Test exact international lookups and last-digits partial lookups"""
+        for query in ['+14155551234', '5551234', '+1415']:
+            response = self.client.get('/api/search/', {'q': query, 'type': 'phone'})
+            self.assertEqual([r['name'] for r in response.data['results']], ['John Doe'], query)
+
+        response = self.client.get('/api/search/', {'q': '0001', 'type': 'phone'})
+        self.assertTrue(response.data['results'][0]['is_registered'])
+
+        # Digits from the middle of the number are not matched (documented)
+        response = self.client.get('/api/search/', {'q': '4155', 'type': 'phone'})
+        self.assertEqual(response.data['results'], [])
+
+class NameIndexSearchTest(TestCase):
+    """
+    Test cases for ranked name search over the name index.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123', first_name='Zed')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.anish = User.objects.create_user(username='anish', password='testpass123', first_name='Anish')
+        self.anish.profile.phone_number = '+12125550002'
+        self.anish.profile.save()
+        self.manish = User.objects.create_user(username='manish', password='testpass123', first_name='Manish')
+        self.manish.profile.phone_number = '+12125550003'
+        self.manish.profile.save()
+
+        self.starts = Contact.objects.create(owner=self.user, name='Anisha Rao', phone_number='+12125551001')
+        self.contains = Contact.objects.create(owner=self.user, name='Tanisha', phone_number='+12125551002')
+        # Same number as a matched registered user, so it is hidden
+        Contact.objects.create(owner=self.user, name='Anish Work', phone_number='+12125550002')
+        # Someone else's contact is never returned
+        Contact.objects.create(owner=self.anish, name='Anil', phone_number='+12125551003')
+
+    def test_ranking_and_filters(self):
+        """Test starts-with before contains, users before contacts, in one query"""
+        with self.assertNumQueries(1):
+            matches = search_name_index(self.user, 'ANI', limit=10)
+        self.assertEqual(matches, [
+            ('user', self.anish.id, NameIndexEntry.RANK_USER_STARTS_WITH),
+            ('contact', self.starts.id, NameIndexEntry.RANK_CONTACT_STARTS_WITH),
+            ('user', self.manish.id, NameIndexEntry.RANK_USER_CONTAINS),
+            ('contact', self.contains.id, NameIndexEntry.RANK_CONTACT_CONTAINS),
+        ])
+        self.assertEqual(len(search_name_index(self.user, 'ani', limit=2)), 2)
+
+    def test_index_follows_renames(self):
+        """Test that renaming a contact updates its index entries"""
+        self.contains.name = 'Bob'
+        self.contains.save()
+        matches = search_name_index(self.user, 'ani', limit=10)
+        self.assertNotIn(('contact', self.contains.id), [(kind, object_id) for kind, object_id, rank in matches])
+        self.assertEqual(search_name_index(self.user, 'bob', limit=10)[0][1], self.contains.id)
+
+    def test_term_range_searched(self):
+        """Test that name search reads only the matching terms of one kind and owner"""
+        with CaptureQueriesContext(connection) as context:
+            search_name_index(self.user, 'ani', limit=10)
+            search_contacts_by_name(self.user, 'ani', limit=10)
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                searches = [row[-1] for row in cursor.fetchall() if 'nameindexentry' in row[-1]]
+                self.assertTrue(searches)
+                for search in searches:
+                    self.assertIn('kind=? AND', search)
+                    self.assertIn('term>? AND term<?', search)
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class SearchPaginationTest(APITestCase):
+    """
+    Test cases for cursor pagination of search results.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', first_name='Anish')
+        self.user.profile.phone_number = '+12125550001'
+        self.user.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            Contact.objects.create(owner=self.user, name=f'Anita {i}', phone_number=f'+1415555100{i}')
+            Contact.objects.create(owner=self.user, name=f'Tanisha {i}', phone_number=f'+1415555200{i}')
+
+    def _collect_pages(self, params):
+        pages = []
+        response = self.client.get('/api/search/', params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([r['name'] for r in response.data['results']])
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_name_search_pages_keep_ranking(self):
+        """Test that paging through name results preserves the full ranking"""
+        pages = self._collect_pages({'q': 'ani', 'type': 'name', 'page_size': 4})
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        names = [name for page in pages for name in page]
+        self.assertEqual(names[0], 'Anish')
+        self.assertEqual(names[1:6], [f'Anita {i}' for i in range(5)])
+        self.assertEqual(names[6:], [f'Tanisha {i}' for i in range(5)])
+
+    def test_phone_search_pages(self):
+        """Test that phone search results are paged by contact name"""
+        pages = self._collect_pages({'q': '+1415555', 'type': 'phone', 'page_size': 3})
+        names = [name for page in pages for name in page]
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(names, sorted(names, key=str.lower))
+        self.assertEqual(len(names), 10)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.client.get('/api/search/', {'q': 'ani', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class BulkImportTest(APITestCase):
+    """
+    Test cases for bulk contact import.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Contact.objects.create(owner=self.user, name='Existing Contact', phone_number='+12125551234')
+
+    def test_bulk_import(self):
+        """Test that valid rows are inserted and bad or duplicate rows are reported"""
+        contacts = [{'name': f'Friend {i}', 'phone_number': f'+1415555{i:04d}'} for i in range(20)]
+        contacts += [
+            {'name': 'Bad Number', 'phone_number': 'abc'},
+            {'name': 'Existing Again', 'phone_number': '+1 212-555-1234'},
+            {'name': 'Friend Again', 'phone_number': '+14155550000'},
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/contacts/import/', {'contacts': contacts}, format='json')
+        self.assertLess(len(queries), 20)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['imported'], 20)
+        self.assertEqual(response.data['failed'], 3)
+        self.assertEqual(
+            [failure['name'] for failure in response.data['failures']],
+            ['Bad Number', 'Existing Again', 'Friend Again']
+        )
+        self.assertIn('phone_number', response.data['failures'][0]['error'])
+
+        contact = Contact.objects.get(name='Friend 7')
+        self.assertEqual(contact.phone_digits, '14155550007')
+        self.assertEqual(PhoneNumberStats.objects.get(phone_number='+14155550007').contact_count, 1)
+        self.assertEqual(search_name_index(self.user, 'friend 7', limit=10), [
+            ('contact', contact.id, NameIndexEntry.RANK_CONTACT_STARTS_WITH)
+        ])
+
+    def test_concurrent_duplicates_not_counted(self):
+        """Test that rows a concurrent import inserted first are reported, not counted"""
+        contacts = [{'name': f'Friend {i}', 'phone_number': f'+1415555{i:04d}'} for i in range(3)]
+
+        def concurrent_import(new_contacts):
+            # Another request commits the same number between the duplicate check and the insert
+            Contact.objects.create(owner=self.user, name='Other Request', phone_number='+14155550001')
+
+        with mock.patch('contacts.importer.assign_contact_ids', side_effect=concurrent_import):
+            imported, failures = import_contacts(self.user, contacts)
+        self.assertEqual(imported, 2)
+        self.assertEqual([failure['name'] for failure in failures], ['Friend 1'])
+        self.assertEqual(Contact.objects.get(phone_number='+14155550001').name, 'Other Request')
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+}, CONTACT_IMPORT_BATCH_SIZE=4)
+class ImportJobTest(APITestCase):
+    """
+    Test cases for background import jobs.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_json_import_job(self):
+        """Test that a job is accepted at once and processed by the worker in chunks"""
+        contacts = [{'name': f'Friend {i}', 'phone_number': f'+1415555{i:04d}'} for i in range(10)]
+        contacts.append({'name': 'Bad Number', 'phone_number': 'abc'})
+        response = self.client.post('/api/contacts/import/jobs/', {'contacts': contacts}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(response.data['total'], 11)
+        self.assertFalse(Contact.objects.exists())
+
+        call_command('run_import_worker', '--once', stdout=StringIO())
+
+        response = self.client.get(f"/api/contacts/import/jobs/{response.data['id']}/")
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(
+            (response.data['processed'], response.data['imported'], response.data['failed']),
+            (11, 10, 1)
+        )
+        self.assertEqual(response.data['failures'][0]['name'], 'Bad Number')
+        self.assertEqual(Contact.objects.filter(owner=self.user).count(), 10)
+
+    def test_csv_import_job(self):
+        """Test that a CSV in the export format can be submitted"""
+        upload = SimpleUploadedFile(
+            'contacts.csv',
+            b'Name,Phone Number,Created At\nJohn Doe,+12125551234,2023-01-01 12:00:00\n',
+            content_type='text/csv'
+        )
+        response = self.client.post('/api/contacts/import/jobs/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        call_command('run_import_worker', '--once', stdout=StringIO())
+        self.assertEqual(Contact.objects.get(owner=self.user).name, 'John Doe')
+        self.assertEqual(ImportJob.objects.get().status, ImportJob.STATUS_COMPLETED)
+
+    def test_invalid_csv_rejected(self):
+        """Test that a file that is not UTF-8 is rejected with 400"""
+        upload = SimpleUploadedFile('contacts.csv', 'Name,Phone Number\nJos\xe9,+12125551234\n'.encode('latin-1'))
+        response = self.client.post('/api/contacts/import/jobs/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('UTF-8', response.data['error'])
+
+    @override_settings(CONTACT_IMPORT_BATCH_SIZE=2, IMPORT_JOB_MAX_FAILURES=3)
+    def test_failures_sampled(self):
+        """Test that every failed row is counted but only the first few are kept"""
+        contacts = [{'name': f'Bad {i}', 'phone_number': 'abc'} for i in range(7)]
+        job = ImportJob.objects.create(owner=self.user, payload=contacts, total=7)
+        call_command('run_import_worker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.failed), (ImportJob.STATUS_COMPLETED, 7))
+        self.assertEqual([failure['name'] for failure in job.failures], ['Bad 0', 'Bad 1', 'Bad 2'])
+
+    def test_abandoned_job_resumed(self):
+        """Test that a running job whose worker died is taken over and resumed"""
+        contacts = [{'name': f'Friend {i}', 'phone_number': f'+1415555{i:04d}'} for i in range(6)]
+        job = ImportJob.objects.create(
+            owner=self.user, payload=contacts, total=6, processed=4, imported=4, status=ImportJob.STATUS_RUNNING
+        )
+        # A worker holding a fresh lease is left alone
+        call_command('run_import_worker', '--once', stdout=StringIO())
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).processed, 4)
+
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+        call_command('run_import_worker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.imported), (ImportJob.STATUS_COMPLETED, 6, 6))
+        self.assertEqual(
+            sorted(Contact.objects.filter(owner=self.user).values_list('name', flat=True)), ['Friend 4', 'Friend 5']
+        )
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+}, EXPORT_CHUNK_SIZE=2)
+class StreamingExportTest(APITestCase):
+    """
+    Test cases for streamed contact export.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            Contact.objects.create(owner=self.user, name=f'Friend {i}', phone_number=f'+1415555000{i}')
+
+    def _content(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_json_export(self):
+        """Test that the streamed JSON matches the previous pretty-printed document"""
+        content = self._content(self.client.get('/api/contacts/export/', {'format': 'json'}))
+        expected = [
+            {
+                'name': contact.name,
+                'phone_number': str(contact.phone_number),
+                'created_at': contact.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for contact in Contact.objects.filter(owner=self.user)
+        ]
+        self.assertEqual(content, json.dumps(expected, indent=2))
+
+    def test_csv_export(self):
+        """Test that the streamed CSV has a header and one row per contact"""
+        content = self._content(self.client.get('/api/contacts/export/csv'))
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ['Name', 'Phone Number', 'Created At'])
+        self.assertEqual([row[0] for row in rows[1:]], [f'Friend {i}' for i in range(5)])
+
+    def test_empty_json_export(self):
+        """Test that an empty address book exports an empty array"""
+        Contact.objects.all().delete()
+        self.assertEqual(json.loads(self._content(self.client.get('/api/export/json'))), [])
+
+    def test_ndjson_export(self):
+        """Test that NDJSON has one compact object per line"""
+        content = self._content(self.client.get('/api/contacts/export/', {'format': 'ndjson'}))
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['name'], 'Friend 0')
+        self.assertNotIn(' ', lines[0].split('"name"')[0])
+
+    def test_gzip_export(self):
+        """Test gzip compression via Accept-Encoding and ?compress=gzip"""
+        plain = self._content(self.client.get('/api/contacts/export/', {'format': 'csv'}))
+        for response in [
+            self.client.get('/api/contacts/export/', {'format': 'csv'}, HTTP_ACCEPT_ENCODING='gzip, deflate'),
+            self.client.get('/api/contacts/export/', {'format': 'csv', 'compress': 'gzip'}),
+        ]:
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'), plain)
+
+        # gzip refused with q=0, including over a wildcard
+        for accept_encoding in ['gzip;q=0, deflate', 'br, *;q=0.5, gzip; q=0', 'identity']:
+            response = self.client.get('/api/contacts/export/', {'format': 'csv'}, HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'), accept_encoding)
+        response = self.client.get('/api/contacts/export/', {'format': 'csv'}, HTTP_ACCEPT_ENCODING='br;q=1, *;q=0.1')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+@override_settings(REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+}, CONTACT_SYNC_PAGE_SIZE=2, CONTACT_SYNC_SAFETY_LAG=0)
+class ContactChangesTest(APITestCase):
+    """
+    Test cases for contact delta sync.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(phone_number='+12125550001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.contacts = [
+            Contact.objects.create(owner=self.user, name=f'Friend {i}', phone_number=f'+1415555000{i}')
+            for i in range(3)
+        ]
+
+    def _sync(self, since=None):
+        changed, deleted = [], []
+        while True:
+            params = {'since': since} if since else {}
+            response = self.client.get('/api/contacts/changes/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changed += [contact['name'] for contact in response.data['changed']]
+            deleted += response.data['deleted']
+            since = response.data['next_since']
+            if not response.data['has_more']:
+                return changed, deleted, since
+
+    def test_delta_sync(self):
+        """Test full sync, then only updates and deletions since the watermark"""
+        changed, deleted, since = self._sync()
+        self.assertEqual(changed, ['Friend 0', 'Friend 1', 'Friend 2'])
+        self.assertEqual(deleted, [])
+
+        self.assertEqual(self._sync(since)[:2], ([], []))
+
+        response = self.client.patch(f'/api/contacts/{self.contacts[1].id}/', {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(f'/api/contacts/{self.contacts[2].id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        changed, deleted, since = self._sync(since)
+        self.assertEqual(changed, ['Renamed'])
+        self.assertEqual(deleted, [self.contacts[2].id])
+
+    def test_invalid_token(self):
+        """Test that a malformed watermark is rejected"""
+        response = self.client.get('/api/contacts/changes/', {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CONTACT_SYNC_SAFETY_LAG=60)
+    def test_late_commit_not_skipped(self):
+        """Test that a row committed after the client synced past its timestamp is still returned"""
+        since = self._sync()[2]
+        late = Contact.objects.create(owner=self.user, name='Late', phone_number='+14155550009')
+        # Stamped before the last sync, as by a long transaction committing late
+        Contact.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+        self.assertIn('Late', self._sync(since)[0])
+
+    def test_tombstone_retention(self):
+        """Test that old tombstones are pruned and tokens older than the retention expire"""
+        since = self._sync()[2]
+        self.client.delete(f'/api/contacts/{self.contacts[0].id}/')
+        ContactTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        call_command('prune_contact_tombstones', stdout=StringIO())
+        self.assertFalse(ContactTombstone.objects.exists())
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=31)):
+            response = self.client.get('/api/contacts/changes/', {'since': since})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+class ExplainQueriesTest(TestCase):
+    """
+    Test cases for the query plan benchmark.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123', first_name='Test')
+        self.user.profile.phone_number = '+12125550001'
+        self.user.profile.save()
+        reporter = User.objects.create_user(username='reporter', password='testpass123')
+        reporter.profile.phone_number = '+12125550002'
+        reporter.profile.save()
+        Contact.objects.create(owner=self.user, name='Dentist Office', phone_number='+14155550001')
+        SpamReport.objects.create(reporter=reporter, phone_number='+14155550001')
+
+    def test_no_full_scans(self):
+        """Test that endpoint queries only scan whole tables or kinds of rows without the indexes"""
+        out = StringIO()
+        call_command('explain_queries', check=True, stdout=out)
+        output = out.getvalue()
+        self.assertIn('contact list (GET /api/contacts/)', output)
+        self.assertIn('SCAN contacts_spamreport', output)
+        self.assertRegex(output, r'Full table scans without the indexes: [1-9]\d*, with them: 0')
+        # Without the name index's (kind, ...) indexes, name search reads every entry of a kind
+        self.assertIn('Low-selectivity index searches without the indexes: 2, with them: 0', output)
+        self.assertIn('USE TEMP B-TREE', output)
+
+        # Nothing the requests wrote or dropped is kept
+        self.assertEqual(SpamReport.objects.count(), 1)
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, SpamReport._meta.db_table)
+        self.assertTrue(any(index['columns'] == ['phone_number', 'reported_at'] for index in indexes.values()))
+
+    def test_plan_checks(self):
+        """Test that index searches on a low-cardinality column alone and sorts are recognised"""
+        self.assertEqual(weak_searches([
+            'SEARCH contacts_nameindexentry USING INDEX contacts_na_kind_0ef9b5_idx (kind=?)',
+            'SEARCH contacts_nameindexentry USING INDEX contacts_na_kind_da8572_idx (kind=? AND term>? AND term<?)',
+            'SEARCH contacts_contact USING INDEX contacts_co_owner_i_1287e0_idx (owner_id=?)',
+            'Index Scan using contacts_na_kind_0ef9b5_idx on contacts_nameindexentry  (cost=0.29..8.31 rows=1)',
+            "Index Cond: ((kind)::text = 'user'::text)",
+            'Index Scan using contacts_na_kind_da8572_idx on contacts_nameindexentry  (cost=0.29..8.31 rows=1)',
+            "Index Cond: (((kind)::text = 'user'::text) AND ((term)::text >= 'an'::text))",
+        ]), ['contacts_nameindexentry', 'contacts_nameindexentry'])
+        self.assertEqual(
+            sorts(['USE TEMP B-TREE FOR ORDER BY', '->  Sort  (cost=8.32..8.33 rows=1)', 'SCAN contacts_spamreport']),
+            ['USE TEMP B-TREE FOR ORDER BY', '->  Sort  (cost=8.32..8.33 rows=1)']
+        )
+
+@override_settings(CONTACT_SHARDS=['shard0', 'shard1'], REST_FRAMEWORK={
+    'DEFAULT_THROTTLE_CLASSES': [],
+    'DEFAULT_THROTTLE_RATES': {}
+})
+class ShardingTest(TransactionTestCase):
+    """
+    Test cases for contacts sharded by owner.
+    """
+    databases = {'default', 'shard0', 'shard1'}
+
+    def setUp(self):
+        cache.clear()
+        # Ids reserved by an earlier test refer to a flushed sequence
+        reset_contact_ids()
+        # Consecutive ids map the two users to different shards
+        self.alice = User.objects.create_user(username='alice', password='testpass123', first_name='Alice')
+        self.alice.profile.phone_number = '+12125550001'
+        self.alice.profile.save()
+        self.bob = User.objects.create_user(username='bob', password='testpass123', first_name='Bob')
+        self.bob.profile.phone_number = '+12125550002'
+        self.bob.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+        patcher = mock.patch.object(ContactListView, 'throttle_classes', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_contacts_stored_on_owner_shard(self):
+        """Test that contacts land on their owner's shard with ids unique across shards"""
+        response = self.client.post('/api/contacts/', {'name': 'Dentist', 'phone_number': '+14155550001'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        bob_contact = Contact.objects.create(owner=self.bob, name='Plumber', phone_number='+14155550001')
+
+        alice_db, bob_db = contact_db_for_owner(self.alice.pk), contact_db_for_owner(self.bob.pk)
+        self.assertNotEqual(alice_db, bob_db)
+        self.assertTrue(Contact.objects.using(alice_db).filter(pk=response.data['id'], owner=self.alice).exists())
+        self.assertEqual(bob_contact._state.db, bob_db)
+        self.assertNotEqual(bob_contact.pk, response.data['id'])
+        self.assertFalse(Contact.objects.using('default').exists())
+
+        self.assertEqual([c['name'] for c in self.client.get('/api/contacts/').data], ['Dentist'])
+        self.assertEqual(
+            self.client.patch(f'/api/contacts/{bob_contact.pk}/', {'name': 'Mine'}).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        self.assertEqual(self.client.delete(f"/api/contacts/{response.data['id']}/").status_code, 204)
+        self.assertFalse(Contact.objects.using(alice_db).exists())
+
+    def test_lookups_merge_shards(self):
+        """Test that spam checks and phone search combine every shard"""
+        Contact.objects.create(owner=self.alice, name='Dentist', phone_number='+14155550001')
+        Contact.objects.create(owner=self.bob, name='Plumber', phone_number='+14155550001')
+
+        response = self.client.get('/api/spam/check/+14155550001/')
+        self.assertEqual(response.data['contact_entries'], 2)
+
+        response = self.client.get('/api/search/', {'q': '+14155550001', 'type': 'phone'})
+        self.assertEqual(sorted(r['name'] for r in response.data['results']), ['Dentist', 'Plumber'])
+
+        PhoneNumberStats.rebuild()
+        self.assertEqual(PhoneNumberStats.objects.get(phone_number='+14155550001').contact_count, 2)
+
+    def test_user_delete_removes_shard_contacts(self):
+        """Test that deleting a user deletes their contacts on the shard"""
+        contact = Contact.objects.create(owner=self.bob, name='Plumber', phone_number='+14155550001')
+        self.bob.delete()
+        self.assertFalse(Contact.objects.using(contact._state.db).exists())
+
+    def test_unrouted_queries_rejected(self):
+        """Test that contact queries must say which shard they are for"""
+        Contact.objects.create(owner=self.bob, name='Plumber', phone_number='+14155550001')
+        self.assertEqual([c.name for c in Contact.objects.for_owner(self.bob)], ['Plumber'])
+        self.assertEqual(self.bob.contacts.count(), 1)
+        self.assertFalse(Contact.objects.for_owner(self.alice).exists())
+        with self.assertRaises(UnroutedContactQuery):
+            Contact.objects.filter(owner=self.bob).count()
+        with self.assertRaises(UnroutedContactQuery):
+            Contact.objects.filter(phone_number='+14155550001').count()
+
+    def test_creates_insert_with_reserved_ids(self):
+        """Test that creates insert directly and share a block of reserved ids"""
+        Contact.objects.create(owner=self.bob, name='Plumber', phone_number='+14155550001')
+        shard = connections[contact_db_for_owner(self.bob.pk)]
+        with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(shard) as queries:
+            contact = Contact.objects.create(owner=self.bob, name='Painter', phone_number='+14155550002')
+            contact.name = 'Decorator'
+            contact.save()
+        self.assertFalse(any('idsequence' in query['sql'] for query in primary.captured_queries))
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries.captured_queries if 'contacts_contact' in query['sql']],
+            ['INSERT', 'SELECT', 'UPDATE']
+        )
+
+    def test_shard_migrations_skip_user_foreign_key(self):
+        """Test that migrating a shard creates only the contact table, without a foreign key to users"""
+        out = StringIO()
+        call_command('sqlmigrate', 'contacts', '0001', database='shard0', stdout=out)
+        self.assertIn('CREATE TABLE "contacts_contact"', out.getvalue())
+        self.assertNotIn('contacts_spamreport', out.getvalue())
+        self.assertNotIn('REFERENCES "auth_user"', out.getvalue())
+
+        # The default database, which holds the users, keeps the key
+        for database, constrained in [('shard0', False), ('default', True)]:
+            out = StringIO()
+            call_command('sqlmigrate', 'contacts', '0015', database=database, stdout=out)
+            self.assertEqual('REFERENCES "auth_user"' in out.getvalue(), constrained)
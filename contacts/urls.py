@@ -2,12 +2,17 @@ from django.urls import path, re_path
 from .views import (
     ContactListView,
     ContactDetailView,
+    ContactChangesView,
     SpamReportView,
     SpamCheckView,
+    SpamCheckBatchView,
     SearchView,
     BulkContactImportView,
+    ImportJobCreateView,
+    ImportJobDetailView,
     ContactExportView
 )
+from . import async_views
 
 # For debugging
 print("Loading contacts/urls.py")
@@ -16,20 +21,28 @@ print("Creating URL patterns...")
 urlpatterns = [
     # Static contact endpoints (specific URLs first)
     path('contacts/import/', BulkContactImportView.as_view(), name='contact-import'),
+    path('contacts/import/jobs/', ImportJobCreateView.as_view(), name='contact-import-job-create'),
+    path('contacts/import/jobs/<int:pk>/', ImportJobDetailView.as_view(), name='contact-import-job-detail'),
     path('contacts/export/', ContactExportView.as_view(), name='contact-export'),
     
     # Add specific format endpoints
     path('contacts/export/csv', ContactExportView.as_view(), name='contact-export-csv'),
     path('contacts/export/json', ContactExportView.as_view(), name='contact-export-json'),
+    path('contacts/export/ndjson', ContactExportView.as_view(), name='contact-export-ndjson'),
     
     # Alternative paths for export (for testing)
     path('export-contacts/', ContactExportView.as_view(), name='contact-export-alt'),
     path('export-contacts/csv', ContactExportView.as_view(), name='contact-export-alt-csv'),
     path('export-contacts/json', ContactExportView.as_view(), name='contact-export-alt-json'),
+    path('export-contacts/ndjson', ContactExportView.as_view(), name='contact-export-alt-ndjson'),
     
     path('export/', ContactExportView.as_view(), name='contact-export-simple'),
     path('export/csv', ContactExportView.as_view(), name='contact-export-simple-csv'),
     path('export/json', ContactExportView.as_view(), name='contact-export-simple-json'),
+    path('export/ndjson', ContactExportView.as_view(), name='contact-export-simple-ndjson'),
+    
+    # Delta sync
+    path('contacts/changes/', ContactChangesView.as_view(), name='contact-changes'),
     
     # Dynamic URLs with parameters
     path('contacts/<int:pk>/', ContactDetailView.as_view(), name='contact-detail'),
@@ -39,10 +52,15 @@ urlpatterns = [
     
     # Spam endpoints
     path('spam/report/', SpamReportView.as_view(), name='spam-report'),
+    path('spam/check/batch/', SpamCheckBatchView.as_view(), name='spam-check-batch'),
     path('spam/check/<str:phone_number>/', SpamCheckView.as_view(), name='spam-check'),
 
     # Search endpoint
     path('search/', SearchView.as_view(), name='search'),
+
+    # Async (ASGI) versions of the lookup endpoints
+    path('async/spam/check/<str:phone_number>/', async_views.spam_check, name='async-spam-check'),
+    path('async/search/', async_views.search, name='async-search'),
 ]
 
 # For debugging
@@ -0,0 +1,63 @@
+from phonenumber_field.phonenumber import PhoneNumber, to_python
+
+
+def normalize_phone_number(value):
+    """
+    Normalize a phone number (string or PhoneNumber) to the E.164 string
+    stored in the database. Unparseable input is returned as given so it
+    still matches the raw value PhoneNumberField would have stored.
+    """
+    phone = to_python(value)
+    if isinstance(phone, PhoneNumber):
+        return phone.as_e164
+    return phone or None
+
+
+SPAM_CACHE_KEY_PREFIX = 'spam_stats_'
+
+
+def spam_cache_key(phone_number):
+    """
+    Cache key for the spam statistics of a phone number. Keyed by the
+    normalized E.164 string so every code path shares one entry.
+    """
+    return f'{SPAM_CACHE_KEY_PREFIX}{normalize_phone_number(phone_number)}'
+
+
+def phone_digits(value):
+    """Digits-only form of a normalized phone number, used as an indexed lookup key"""
+    normalized = normalize_phone_number(value)
+    return ''.join(c for c in str(normalized or '') if c.isdigit())
+
+
+def set_phone_digits(instance):
+    """Populate the digits-only and reversed-digits columns from phone_number"""
+    digits = phone_digits(instance.phone_number)
+    instance.phone_digits = digits
+    instance.phone_digits_reversed = digits[::-1]
+
+
+def prefix_range(prefix):
+    """
+    Bounds for an indexed prefix scan over a string column:
+    column >= lower AND column < upper matches every value starting
+    with prefix, and unlike LIKE can always use a b-tree index.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+NAME_TERM_MAX_LENGTH = 32
+
+
+def name_terms(value):
+    """
+    Lowercase suffixes of a name, truncated to NAME_TERM_MAX_LENGTH.
+    Indexing every suffix lets "contains" queries run as indexed prefix
+    scans; the first term is the name itself and answers "starts with".
+    """
+    value = (value or '').strip().lower()
+    return [
+        value[i:i + NAME_TERM_MAX_LENGTH]
+        for i in range(len(value))
+        if not value[i].isspace()
+    ]
@@ -1,28 +1,48 @@
 from rest_framework import generics, permissions, status, filters
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Q
-from .models import Contact, SpamReport
-from users.models import UserProfile
-from .serializers import ContactSerializer, SpamReportSerializer, SearchResultSerializer
+from .models import Contact, ContactTombstone, NameIndexEntry, ImportJob
+from .serializers import (
+    ContactSerializer, SpamReportSerializer, SearchResultSerializer, ImportJobSerializer,
+    SpamCheckBatchSerializer
+)
+from .spam import get_spam_stats, get_spam_likelihoods, spam_stats_etag
+from .search import (
+    search_name_index, search_contacts_by_name, shared_name_matches, shared_phone_matches,
+    user_search_result, name_matches, cached_page, merge_name_matches, name_search_page,
+    name_search_results, phone_contact_matches
+)
+from .pagination import SearchCursorPagination
+from .importer import import_contacts, parse_contacts_csv
+from .jobs import enqueue_import_job
+from .sync import SyncTokenExpired, get_contact_changes
+from .export import (
+    export_rows, stream_csv, stream_json, stream_ndjson, buffered, gzip_stream, wants_gzip
+)
+from .utils import normalize_phone_number, phone_digits, prefix_range
 from .throttles import ContactCreateThrottle, SpamReportThrottle
-from phonenumber_field.phonenumber import PhoneNumber
+from caller_id.routers import ReplicaReadMixin
+from phonenumber_field.phonenumber import PhoneNumber, to_python
 from django.contrib.auth import get_user_model
 from rest_framework.throttling import UserRateThrottle
 from rest_framework.views import APIView
-from django.core.cache import cache
+from rest_framework.negotiation import DefaultContentNegotiation
 from django.conf import settings
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
 import csv
 import json
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
 User = get_user_model()
 
 # Create your views here.
 
-class ContactListView(generics.ListCreateAPIView):
+class ContactListView(ReplicaReadMixin, generics.ListCreateAPIView):
     """
     List and create contacts.
     Supports searching by name or phone number.
@@ -37,7 +57,7 @@ class ContactListView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         """Get contacts for the current user with optional search"""
-        queryset = Contact.objects.filter(owner=self.request.user)
+        queryset = Contact.objects.for_owner(self.request.user)
         search_query = self.request.query_params.get('q', None)
         if search_query:
             queryset = queryset.filter(
@@ -63,7 +83,42 @@ class ContactDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         """Get contacts for the current user"""
-        return Contact.objects.filter(owner=self.request.user)
+        return Contact.objects.for_owner(self.request.user)
+
+    def perform_destroy(self, instance):
+        """Delete the contact and leave a tombstone for delta sync"""
+        # The contact may be on a shard; commit both deletes together
+        with transaction.atomic(), transaction.atomic(using=instance._state.db):
+            ContactTombstone.objects.create(owner=instance.owner, contact_id=instance.pk)
+            instance.delete()
+
+class ContactChangesView(APIView):
+    """
+    Delta sync for contacts.
+    Returns contacts created or updated and ids of contacts deleted since
+    the opaque ?since= watermark, plus the watermark for the next call.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        """List contact changes since a watermark"""
+        try:
+            contacts, deleted, next_token, has_more = get_contact_changes(
+                request.user, request.query_params.get('since'), settings.CONTACT_SYNC_PAGE_SIZE
+            )
+        except SyncTokenExpired:
+            return Response(
+                {'error': 'Sync token expired, sync again without since'}, status=status.HTTP_410_GONE
+            )
+        except ValueError:
+            return Response({'error': 'Invalid since token'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'changed': ContactSerializer(contacts, many=True).data,
+            'deleted': deleted,
+            'next_since': next_token,
+            'has_more': has_more
+        })
 
 class SpamReportView(generics.CreateAPIView):
     """
@@ -78,37 +133,90 @@ class SpamReportView(generics.CreateAPIView):
         """Create a spam report from the current user"""
         serializer.save(reporter=self.request.user)
 
-class SpamCheckView(generics.RetrieveAPIView):
+# Body of the 400 response for a number that is not a valid phone number
+INVALID_PHONE_NUMBER = {'error': 'Invalid phone number'}
+
+def spam_check_data(phone_obj, stats):
+    """Spam check response body for one phone number"""
+    return {
+        'phone_number': str(phone_obj),
+        'spam_likelihood': stats['spam_likelihood'],
+        'spam_reports': stats['spam_reports'],
+        'contact_entries': stats['contact_entries']
+    }
+
+class SpamCheckView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     Check spam likelihood for a phone number.
     Returns spam likelihood percentage and report counts.
+    Responses carry ETag and Last-Modified headers taken from the cached
+    statistics entry, so a client re-checking a number it already has
+    gets a 304 without touching the database.
     """
     permission_classes = (permissions.IsAuthenticated,)
 
     def get(self, request, phone_number):
         """Get spam statistics for a phone number"""
         # Parse phone number
-        phone_obj = PhoneNumber.from_string(phone_number)
-        
-        # Count spam reports
-        spam_count = SpamReport.objects.filter(phone_number=phone_obj).count()
-        # Count contacts (non-spam)
-        contact_count = Contact.objects.filter(phone_number=phone_obj).count()
-        
-        total_references = spam_count + contact_count
-        spam_likelihood = (spam_count / total_references * 100) if total_references > 0 else 0
+        phone_obj = to_python(phone_number)
+        if phone_obj is None or not phone_obj.is_valid():
+            return Response(INVALID_PHONE_NUMBER, status=status.HTTP_400_BAD_REQUEST)
+        number = normalize_phone_number(phone_obj)
+
+        # Read precomputed statistics for the number
+        stats = get_spam_stats([phone_obj])[number]
+        etag = spam_stats_etag(number, stats)
+        last_modified = stats['updated_at'] and int(stats['updated_at'].timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(spam_check_data(phone_obj, stats))
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        # Let clients keep the result but make them revalidate on every check
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class SpamCheckBatchView(ReplicaReadMixin, APIView):
+    """
+    Check spam likelihood for many phone numbers in one request.
+    All numbers are resolved with one bulk cache lookup, and the misses
+    with one stats query plus grouped counts. Returns a map from each
+    submitted number to the body SpamCheckView returns for it; numbers
+    that are not valid phone numbers are listed under "invalid".
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    # Checking numbers does not write, so POSTs are served by the replica
+    replica_methods = ('POST',)
+
+    def post(self, request):
+        serializer = SpamCheckBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        phone_objs = {}
+        invalid = []
+        for value in serializer.validated_data['phone_numbers']:
+            phone_obj = to_python(value)
+            if phone_obj is None or not phone_obj.is_valid():
+                invalid.append(value)
+            else:
+                phone_objs[value] = phone_obj
 
+        stats = get_spam_stats(phone_objs.values())
         return Response({
-            'phone_number': str(phone_obj),
-            'spam_likelihood': round(spam_likelihood, 2),
-            'spam_reports': spam_count,
-            'contact_entries': contact_count
+            'results': {
+                value: spam_check_data(phone_obj, stats[normalize_phone_number(phone_obj)])
+                for value, phone_obj in phone_objs.items()
+            },
+            'invalid': invalid
         })
 
 class SearchThrottle(UserRateThrottle):
     rate = '100/minute'
 
-class SearchView(APIView):
+class SearchView(ReplicaReadMixin, APIView):
     throttle_classes = [SearchThrottle]
 
     def get(self, request, *args, **kwargs):
@@ -128,179 +236,241 @@ class SearchView(APIView):
                 search_type = 'name'
             print(f"Auto-detected search type: {search_type} for query: {query}")
 
+        paginator = SearchCursorPagination()
+        page_size = paginator.get_page_size(request)
+        cursor = paginator.decode_cursor(request)
+
         if search_type == 'name':
-            results = self._search_by_name(request.user, query)
+            results, next_position = self._search_by_name(request.user, query, page_size, cursor)
         elif search_type == 'phone':
-            results = self._search_by_phone(request.user, query)
+            results, next_position = self._search_by_phone(request.user, query, page_size, cursor)
         else:
             return Response({'error': 'Invalid search type'}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = SearchResultSerializer(results, many=True, context={'request': request})
-        return Response(serializer.data)
-
-    def _search_by_name(self, user, query):
-        """Search by name in both registered users and contacts"""
-        # Search in registered users - first exact matches, then partial matches
-        starts_with_users = User.objects.filter(
-            Q(first_name__istartswith=query) | Q(last_name__istartswith=query)
-        ).distinct()
-        
-        contains_users = User.objects.filter(
-            ~Q(first_name__istartswith=query) & ~Q(last_name__istartswith=query) &
-            (Q(first_name__icontains=query) | Q(last_name__icontains=query))
-        ).distinct()
-        
-        # Combine the user results with priority to those starting with the query
-        registered_users = list(starts_with_users) + list(contains_users)
-
-        # Get phone numbers of registered users to exclude from contacts
-        registered_phone_numbers = set(UserProfile.objects.filter(
-            user__in=registered_users
-        ).values_list('phone_number', flat=True))
-
-        # Search in user's contacts - first exact matches, then partial matches
-        starts_with_contacts = Contact.objects.filter(
-            owner=user,
-            name__istartswith=query
-        ).exclude(phone_number__in=registered_phone_numbers)
-        
-        contains_contacts = Contact.objects.filter(
-            owner=user,
-            name__icontains=query
-        ).exclude(
-            Q(name__istartswith=query) | Q(phone_number__in=registered_phone_numbers)
-        )
+        self._attach_spam_likelihood(results)
+        serializer = SearchResultSerializer(results, many=True, context={
+            'request': request,
+            'contact_numbers': self._owned_phone_numbers(request.user, results)
+        })
+        return paginator.get_paginated_response(request, serializer.data, next_position)
+
+    def _search_by_name(self, user, query, page_size, cursor=None):
+        """
+        Search by name in both registered users and contacts.
+        Returns one page of results and the position to continue from.
+        """
+        after = None
+        if cursor is not None:
+            try:
+                after = (int(cursor['rank']), int(cursor['id']))
+            except (KeyError, TypeError, ValueError):
+                raise NotFound(SearchCursorPagination.invalid_cursor_message)
+
+        # Registered users matching the query are the same for every searcher
+        # and come from the shared cache; only the searcher's own contacts
+        # are queried per request. Both follow the name index ranking: users
+        # that start with the query, contacts that start with it, then users
+        # and contacts that contain it.
+        shared = shared_name_matches(query)
+        if shared['complete']:
+            user_results = {result['id']: result for rank, result in shared['users']}
+            matches = merge_name_matches(
+                shared,
+                search_contacts_by_name(user, query, page_size + 1, after=after, exclude_digits=shared['digits']),
+                after, page_size + 1
+            )
+        else:
+            # Too many users match to cache; run one ranked query over the name index
+            matches = search_name_index(user, query, page_size + 1, after=after)
+            user_results = None
+
+        matches, next_position = name_search_page(matches, page_size)
+
+        user_ids = [object_id for kind, object_id, rank in matches if kind == NameIndexEntry.KIND_USER]
+        contact_ids = [object_id for kind, object_id, rank in matches if kind == NameIndexEntry.KIND_CONTACT]
+        if user_results is None:
+            user_results = {
+                user_obj.id: user_search_result(user_obj)
+                for user_obj in User.objects.select_related('profile').in_bulk(user_ids).values()
+                if name_matches(query, user_obj.first_name, user_obj.last_name)
+            }
+        # Name search only returns the searcher's own contacts
+        contacts = Contact.objects.for_owner(user).in_bulk(contact_ids)
+        for contact in contacts.values():
+            contact.owner = user
+
+        return name_search_results(query, matches, user_results, contacts), next_position
+
+    def _search_by_phone(self, user, query, page_size, cursor=None):
+        """
+        Search by phone number in both registered users and contacts.
+        Returns one page of results and the position to continue from.
+        Pages are served from the shared search cache when it holds them.
+        """
+        # A cursor holds either the last registered user id or the last contact name
+        if cursor is not None and not (
+            isinstance(cursor.get('id'), int) or isinstance(cursor.get('name'), str)
+        ):
+            raise NotFound(SearchCursorPagination.invalid_cursor_message)
 
-        # Combine results with prioritization
+        try:
+            phone_lookup = self._phone_lookup(query)
+            if phone_lookup is None:
+                return [], None
+
+            page = self._cached_phone_page(user, shared_phone_matches(phone_lookup), page_size, cursor)
+            if page is not None:
+                return page
+            return self._search_by_phone_in_db(user, phone_lookup, page_size, cursor)
+        except Exception as e:
+            print(f"Error in search_by_phone: {e}")
+            return [], None
+
+    def _cached_phone_page(self, user, shared, page_size, cursor):
+        """
+        One page of phone search results from the shared cache entry, with
+        contact emails shown only to their owner. Returns None if the entry
+        does not hold the whole page.
+        """
+        if cursor is None or 'id' in cursor:
+            # If registered users have this number, only show them
+            if shared['kind'] == 'users' or cursor is not None:
+                users = []
+                if shared['kind'] == 'users':
+                    users = [item for item in shared['items'] if cursor is None or item['id'] > cursor['id']]
+                page = cached_page(users, page_size, shared['complete'] or shared['kind'] != 'users')
+                if page is None:
+                    return None
+                users, has_more = page
+                next_position = {'id': users[-1]['id']} if has_more else None
+                return [dict(item) for item in users], next_position
+        elif shared['kind'] != 'contacts':
+            return None
+
+        names = [item for item in shared['items'] if cursor is None or item['name_key'] > cursor['name']]
+        page = cached_page(names, page_size, shared['complete'])
+        if page is None:
+            return None
+        names, has_more = page
+        next_position = {'name': names[-1]['name_key']} if has_more else None
+        return [
+            {
+                'id': item['id'],
+                'name': item['name'],
+                'phone_number': item['phone_number'],
+                # Email is only shown if the searching user is the owner
+                'email': item['owner_email'] if item['owner_id'] == user.id else None,
+                'is_registered': False
+            }
+            for item in names
+        ], next_position
+
+    def _search_by_phone_in_db(self, user, phone_lookup, page_size, cursor=None):
+        """
+        Search by phone number in both registered users and contacts.
+        Returns one page of results and the position to continue from.
+        """
         results = []
-        # Add users that start with the query
-        for user_obj in starts_with_users:
-            results.append({
-                'id': user_obj.id,
-                'name': f"{user_obj.first_name} {user_obj.last_name}".strip(),
-                'phone_number': str(user_obj.profile.phone_number),
-                'email': user_obj.email,
-                'is_registered': True,
-                'spam_likelihood': self._calculate_spam_likelihood(user_obj.profile.phone_number)
-            })
-            
-        # Add contacts that start with the query
-        for contact in starts_with_contacts:
-            results.append({
-                'id': contact.id,
-                'name': contact.name,
-                'phone_number': str(contact.phone_number),
-                'email': contact.owner.email if contact.owner else None,
-                'is_registered': False,
-                'spam_likelihood': self._calculate_spam_likelihood(contact.phone_number)
-            })
-            
-        # Add users that contain but don't start with the query
-        for user_obj in contains_users:
-            results.append({
-                'id': user_obj.id,
-                'name': f"{user_obj.first_name} {user_obj.last_name}".strip(),
-                'phone_number': str(user_obj.profile.phone_number),
-                'email': user_obj.email,
-                'is_registered': True,
-                'spam_likelihood': self._calculate_spam_likelihood(user_obj.profile.phone_number)
-            })
-            
-        # Add contacts that contain but don't start with the query
-        for contact in contains_contacts:
-            results.append({
-                'id': contact.id,
-                'name': contact.name,
-                'phone_number': str(contact.phone_number),
-                'email': contact.owner.email if contact.owner else None,
-                'is_registered': False,
-                'spam_likelihood': self._calculate_spam_likelihood(contact.phone_number)
-            })
 
-        return results
-
-    def _search_by_phone(self, user, query):
-        """Search by phone number in both registered users and contacts"""
-        try:
-            from phonenumber_field.phonenumber import PhoneNumber
-            
-            # Try to create a properly formatted PhoneNumber object
-            try:
-                phone_number = PhoneNumber.from_string(query)
-                formatted_number = str(phone_number)
-            except Exception as e:
-                # If formatting fails, use the original query for partial matching
-                print(f"Phone number parsing error: {e}")
-                formatted_number = query
-                
-            results = []
+        # Check for matches in registered users
+        if cursor is None or 'id' in cursor:
+            registered_users = User.objects.select_related('profile').filter(
+                **{f'profile__{lookup}': value for lookup, value in phone_lookup.items()}
+            ).order_by('id')
+            if cursor is not None:
+                registered_users = registered_users.filter(id__gt=cursor['id'])
+            registered_users = list(registered_users[:page_size + 1])
 
-            # Check for exact matches in registered users
-            registered_users = User.objects.filter(profile__phone_number__contains=query)
-            
             # If we found registered users with this number, only show them
-            if registered_users.exists():
+            if registered_users or cursor is not None:
+                next_position = None
+                if len(registered_users) > page_size:
+                    registered_users = registered_users[:page_size]
+                    next_position = {'id': registered_users[-1].id}
                 for registered_user in registered_users:
                     results.append({
                         'id': registered_user.id,
                         'name': f"{registered_user.first_name} {registered_user.last_name}".strip(),
                         'phone_number': str(registered_user.profile.phone_number),
                         'email': registered_user.email,
-                        'is_registered': True,
-                        'spam_likelihood': self._calculate_spam_likelihood(registered_user.profile.phone_number)
-                    })
-                return results
-            
-            # If no registered user found with this number, search in all contacts with partial matching
-            all_contacts = Contact.objects.filter(
-                Q(phone_number__contains=query) | 
-                Q(phone_number__exact=query)
-            )
-            
-            # Deduplicate by name (since the same name could appear multiple times)
-            seen_names = set()
-            for contact in all_contacts:
-                # Only add unique names for the same number
-                if contact.name.lower() not in seen_names:
-                    results.append({
-                        'id': contact.id,
-                        'name': contact.name,
-                        'phone_number': str(contact.phone_number),
-                        # Email is only shown if the searching user is the owner
-                        'email': contact.owner.email if contact.owner == user else None,
-                        'is_registered': False,
-                        'spam_likelihood': self._calculate_spam_likelihood(contact.phone_number)
+                        'is_registered': True
                     })
-                    seen_names.add(contact.name.lower())
+                return results, next_position
+        
+        # If no registered user found with this number, search in all contacts with partial matching.
+        # Deduplicate by name (since the same name could appear multiple times),
+        # keeping the first contact for each name
+        names = phone_contact_matches(
+            phone_lookup, page_size + 1, after_name=cursor['name'] if cursor is not None else None
+        )
 
-            return results
-        except Exception as e:
-            print(f"Error in search_by_phone: {e}")
-            return []
-
-    def _calculate_spam_likelihood(self, phone_number):
-        """Calculate spam likelihood based on spam reports and references"""
-        # Check cache first
-        cache_key = f'spam_likelihood_{phone_number}'
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            return cached_result
-            
-        # Get total number of references (spam reports + contacts)
-        spam_reports = SpamReport.objects.filter(phone_number=phone_number).count()
-        contact_references = Contact.objects.filter(phone_number=phone_number).count()
-        total_references = spam_reports + contact_references
+        next_position = None
+        if len(names) > page_size:
+            names = names[:page_size]
+            next_position = {'name': names[-1][0]}
 
-        if total_references == 0:
-            return 0.0
+        for name_key, contact in names:
+            results.append({
+                'id': contact.id,
+                'name': contact.name,
+                'phone_number': str(contact.phone_number),
+                # Email is only shown if the searching user is the owner
+                'email': contact.owner.email if contact.owner_id == user.id else None,
+                'is_registered': False
+            })
 
-        # Calculate percentage of spam reports
-        result = round((spam_reports / total_references) * 100, 2)
-        
-        # Cache the result
-        cache.set(cache_key, result, settings.CACHE_TIMEOUT)
-        
-        return result
+        return results, next_position
+
+    def _phone_lookup(self, query):
+        """
+        Build indexed lookups on the digits-only phone columns.
+        A complete number in international format is an exact match, any other
+        query starting with '+' matches by leading digits, and bare digits match
+        the end of the number (so "5551234" finds "+1 212-555-1234").
+        Digits from the middle of a number (an area code without the country
+        code) match nothing: that would need an unindexed LIKE '%...%' scan.
+        Returns None if the query contains no digits.
+        """
+        digits = ''.join(c for c in query if c.isdigit())
+        if not digits:
+            return None
+
+        if query.startswith('+'):
+            try:
+                phone_number = PhoneNumber.from_string(query)
+                if phone_number.is_valid():
+                    return {'phone_digits': phone_digits(phone_number)}
+            except Exception as e:
+                # Not a complete number, fall back to matching leading digits
+                print(f"Phone number parsing error: {e}")
+            field, value = 'phone_digits', digits
+        else:
+            field, value = 'phone_digits_reversed', digits[::-1]
+
+        lower, upper = prefix_range(value)
+        return {f'{field}__gte': lower, f'{field}__lt': upper}
+
+    def _owned_phone_numbers(self, user, results):
+        """Phone numbers among the results that the user has in their contacts"""
+        numbers = {normalize_phone_number(result['phone_number']) for result in results}
+        numbers.discard(None)
+        if not numbers:
+            return set()
+        return {
+            normalize_phone_number(number)
+            for number in Contact.objects.for_owner(user).filter(
+                phone_number__in=numbers
+            ).values_list('phone_number', flat=True)
+        }
+
+    def _attach_spam_likelihood(self, results):
+        """Fill in spam likelihood for every result with one batched lookup"""
+        likelihoods = get_spam_likelihoods(result['phone_number'] for result in results)
+        for result in results:
+            result['spam_likelihood'] = likelihoods.get(
+                normalize_phone_number(result['phone_number']), 0.0
+            )
+        return results
 
 class BulkContactImportView(APIView):
     """
@@ -317,21 +487,7 @@ class BulkContactImportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        imported = 0
-        failures = []
-        
-        for contact_data in contacts_data:
-            serializer = ContactSerializer(data=contact_data)
-            try:
-                if serializer.is_valid(raise_exception=True):
-                    serializer.save(owner=request.user)
-                    imported += 1
-            except ValidationError as e:
-                failures.append({
-                    'name': contact_data.get('name', ''),
-                    'phone_number': contact_data.get('phone_number', ''),
-                    'error': str(e)
-                })
+        imported, failures = import_contacts(request.user, contacts_data)
                 
         return Response({
             'imported': imported,
@@ -339,6 +495,51 @@ class BulkContactImportView(APIView):
             'failures': failures
         }, status=status.HTTP_201_CREATED)
 
+class ImportJobCreateView(APIView):
+    """
+    Submit a contact import to run in the background.
+    Accepts JSON ({"contacts": [...]}) or a CSV upload in the "file" field
+    and returns the job id at once; progress is polled from ImportJobDetailView.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        """Create an import job"""
+        csv_file = request.FILES.get('file')
+        if csv_file is not None:
+            try:
+                contacts_data = parse_contacts_csv(csv_file)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            contacts_data = request.data.get('contacts', [])
+
+        if not contacts_data or not isinstance(contacts_data, list):
+            return Response(
+                {'error': 'No contacts provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        job = ImportJob.objects.create(
+            owner=request.user,
+            payload=contacts_data,
+            total=len(contacts_data)
+        )
+        enqueue_import_job(job)
+
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    """
+    Poll the progress of an import job.
+    """
+    serializer_class = ImportJobSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        """Get import jobs for the current user"""
+        return ImportJob.objects.filter(owner=self.request.user).defer('payload')
+
 # Custom permission class for testing
 class AllowAnyInTestMode(permissions.IsAuthenticated):
     def has_permission(self, request, view):
@@ -349,15 +550,24 @@ class AllowAnyInTestMode(permissions.IsAuthenticated):
         # Otherwise use regular authentication
         return super().has_permission(request, view)
 
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Let the export view handle ?format= itself instead of DRF treating
+    it as a renderer override (which 404s for csv/ndjson).
+    """
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
 @method_decorator(csrf_exempt, name='dispatch')
-class ContactExportView(APIView):
+class ContactExportView(ReplicaReadMixin, APIView):
     """
-    Export contacts in different formats (CSV, JSON)
+    Export contacts in different formats (CSV, JSON, NDJSON), optionally gzip-compressed
     """
     permission_classes = (AllowAnyInTestMode,)
+    content_negotiation_class = ExportContentNegotiation
     
     def get(self, request, *args, **kwargs):
-        """Export contacts in CSV or JSON format"""
+        """Export contacts in CSV, JSON or NDJSON format"""
         print(f"ContactExportView.get() called with user: {request.user}, authenticated: {request.user.is_authenticated}")
         print(f"Request headers: {request.headers}")
         print(f"Request query params: {request.query_params}")
@@ -406,8 +616,7 @@ class ContactExportView(APIView):
                     return response
         
         # For normal operation, get contacts for the current user
-        contacts = Contact.objects.filter(owner=request.user)
-        print(f"Found {contacts.count()} contacts for user {request.user}")
+        contacts = Contact.objects.for_owner(request.user)
         
         # Get the requested format (default to JSON)
         export_format = request.query_params.get('format', 'json').lower()
@@ -416,46 +625,31 @@ class ContactExportView(APIView):
         path = request.path
         if path.endswith('csv'):
             export_format = 'csv'
+        elif path.endswith('ndjson'):
+            export_format = 'ndjson'
         elif path.endswith('json'):
             export_format = 'json'
             
         print(f"Export format: {export_format}")
         
+        # Rows are streamed straight from the database cursor. Streaming runs
+        # after the view returns, so fix the database chosen for this request
+        rows = export_rows(contacts.using(contacts.db))
         if export_format == 'csv':
-            print("Generating CSV response")
-            # Create CSV response
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = 'attachment; filename="contacts.csv"'
-            
-            writer = csv.writer(response)
-            writer.writerow(['Name', 'Phone Number', 'Created At'])
-            
-            for contact in contacts:
-                writer.writerow([
-                    contact.name,
-                    str(contact.phone_number),
-                    contact.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                ])
-            
-            print(f"CSV response ready with {contacts.count()} rows")
-            return response
-            
+            content, content_type, filename = stream_csv(rows), 'text/csv', 'contacts.csv'
+        elif export_format == 'ndjson':
+            content, content_type, filename = stream_ndjson(rows), 'application/x-ndjson', 'contacts.ndjson'
         else:  # JSON format
-            print("Generating JSON response")
-            # Create JSON response
-            contact_data = []
-            for contact in contacts:
-                contact_data.append({
-                    'name': contact.name,
-                    'phone_number': str(contact.phone_number),
-                    'created_at': contact.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                })
-            
-            response = HttpResponse(
-                json.dumps(contact_data, indent=2),
-                content_type='application/json'
-            )
-            response['Content-Disposition'] = 'attachment; filename="contacts.json"'
-            
-            print(f"JSON response ready with {len(contact_data)} contacts")
-            return response
+            content, content_type, filename = stream_json(rows), 'application/json', 'contacts.json'
+
+        content = buffered(content)
+        compress = wants_gzip(request)
+        if compress:
+            content = gzip_stream(content)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Vary'] = 'Accept-Encoding'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_phone_digits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='reputation',
+            field=models.FloatField(default=1.0),
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 from phonenumber_field.modelfields import PhoneNumberField
+from contacts.utils import set_phone_digits
 
 # Create your models here.
 
@@ -13,10 +14,21 @@ class UserProfile(models.Model):
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone_number = PhoneNumberField(unique=True)
+    phone_digits = models.CharField(max_length=32, db_index=True, editable=False, default='')
+    phone_digits_reversed = models.CharField(max_length=32, db_index=True, editable=False, default='')
+    # Weight of this user's spam reports (see contacts.scoring.DecayedScorer)
+    reputation = models.FloatField(default=1.0)
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.phone_number})"
 
+@receiver(pre_save, sender=UserProfile)
+def populate_phone_digits(sender, instance, **kwargs):
+    """
+    Signal handler to fill the indexed digits-only lookup columns.
+    """
+    set_phone_digits(instance)
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """